@@ -1,6 +1,8 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 import redis
 import json
+import hashlib
+import hmac
 import logging
 import time
 from cryptography.fernet import Fernet
@@ -10,9 +12,21 @@ from cyborgdb.openapi_client.models import IndexIVFFlatModel
 import dotenv
 from google import genai
 from load_demo_data import MOCK_DATA
+from cyborgdb_transport import CyborgDBTransport
+from llm_governor import LLMGovernor, LLMUnavailable
+from embedder import CachedEmbedder, make_embedder
+from lexical_index import LexicalIndex
+import record_codec
+import metrics
 import os
+import sys
 import requests
+import socket
 import time
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # -------------------------------------------
@@ -40,16 +54,139 @@ CYBORGDB_URL = os.getenv("CYBORGDB_URL")
 
 REDIS_URL = os.getenv("REDIS_URL")
 
+# CyborgDB REST transport
+CYBORGDB_POOL_SIZE = int(os.getenv("CYBORGDB_POOL_SIZE", "20"))
+CYBORGDB_CONNECT_TIMEOUT = float(os.getenv("CYBORGDB_CONNECT_TIMEOUT", "3.05"))
+CYBORGDB_READ_TIMEOUT = float(os.getenv("CYBORGDB_READ_TIMEOUT", "30"))
+CYBORGDB_MAX_RETRIES = int(os.getenv("CYBORGDB_MAX_RETRIES", "3"))
+CYBORGDB_RETRY_BACKOFF = float(os.getenv("CYBORGDB_RETRY_BACKOFF", "0.2"))
+
+# Bulk ingest (/upsert-encounters)
+BULK_MAX_ENCOUNTERS = int(os.getenv("BULK_MAX_ENCOUNTERS", "5000"))
+BULK_NORMALIZE_CONCURRENCY = int(os.getenv("BULK_NORMALIZE_CONCURRENCY", "8"))
+BULK_UPSERT_CHUNK_SIZE = int(os.getenv("BULK_UPSERT_CHUNK_SIZE", "500"))
+
+# Batched normalization for bulk ingest: encounters per Gemini prompt
+# (1 disables batching) and a cap on the encounter JSON packed into one
+NORMALIZE_BATCH_SIZE = int(os.getenv("NORMALIZE_BATCH_SIZE", "8"))
+NORMALIZE_BATCH_MAX_CHARS = int(os.getenv("NORMALIZE_BATCH_MAX_CHARS", "24000"))
+
+# Optional per-hospital sharding: 0 keeps everything in INDEX_NAME.
+# INDEX_SHARD_MAP pins hospitals to shards, e.g. {"CITY_GEN_01": 0}
+INDEX_SHARDS = int(os.getenv("INDEX_SHARDS", "0"))
+INDEX_SHARD_MAP = json.loads(os.getenv("INDEX_SHARD_MAP", "{}"))
+# Threads for concurrent shard queries across all requests (0 = CYBORGDB_POOL_SIZE)
+SHARD_QUERY_WORKERS = int(os.getenv("SHARD_QUERY_WORKERS", "0"))
+
+# Seconds each process caches the INDEX_NAME alias (see reindex.py)
+INDEX_ALIAS_TTL = float(os.getenv("INDEX_ALIAS_TTL", "2"))
+
+# Retrieval sizing and local-scope strategy ("filter" or "overfetch")
+SEARCH_TOP_K = int(os.getenv("SEARCH_TOP_K", "10"))
+SEARCH_RESULT_LIMIT = int(os.getenv("SEARCH_RESULT_LIMIT", "5"))
+LOCAL_SEARCH_MODE = os.getenv("LOCAL_SEARCH_MODE", "filter")
+LOCAL_SEARCH_MAX_TOP_K = int(os.getenv("LOCAL_SEARCH_MAX_TOP_K", "160"))
+# Filter mode: also over-fetch unfiltered for vectors written before the
+# hospital_tag existed (only needed until legacy vectors are re-upserted)
+LOCAL_SEARCH_LEGACY_OVERFETCH = os.getenv("LOCAL_SEARCH_LEGACY_OVERFETCH", "false").lower() in ("1", "true", "yes")
+
+# In-process BM25 index over the semantic text: answers searches when the vector
+# query fails or overruns SEARCH_VECTOR_TIMEOUT_MS (0 = SEARCH_VECTOR_BUDGET_FRACTION
+# of the request budget) and, with a weight above 0, re-ranks vector candidates
+LEXICAL_INDEX = os.getenv("LEXICAL_INDEX", "true").lower() in ("1", "true", "yes")
+LEXICAL_LOG_MAXLEN = int(os.getenv("LEXICAL_LOG_MAXLEN", "10000"))
+LEXICAL_RERANK_WEIGHT = float(os.getenv("LEXICAL_RERANK_WEIGHT", "0"))
+SEARCH_VECTOR_TIMEOUT_MS = int(os.getenv("SEARCH_VECTOR_TIMEOUT_MS", "0"))
+SEARCH_VECTOR_BUDGET_FRACTION = float(os.getenv("SEARCH_VECTOR_BUDGET_FRACTION", "0.4"))
+
+# Startup seeding is opt-in (or run: python app.py seed)
+SEED_ON_STARTUP = os.getenv("SEED_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+# Gemini + persistent LLM response cache; TTL of 0 disables the cache
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "604800"))
+
+# Embeddings: "server" lets CyborgDB embed contents itself; "local" and "stub"
+# embed here, through an LRU + Redis cache, and send vectors instead. Local
+# vectors must come from the model (and dimension) the index was created with.
+EMBEDDER = os.getenv("EMBEDDER", "server")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "384"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", "2592000"))
+
+# LLM governor: concurrency cap, quota-matched rate limit (0 = off),
+# per-purpose deadlines and a circuit breaker that fails fast to fallbacks
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "0"))
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", "0")) or None
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+LLM_DEADLINES = {
+    "synthesize": float(os.getenv("LLM_SYNTHESIZE_TIMEOUT", "10")),
+    "normalize": float(os.getenv("LLM_NORMALIZE_TIMEOUT", "30")),
+    "normalize_batch": float(os.getenv("LLM_NORMALIZE_BATCH_TIMEOUT", "60")),
+}
+
+# End-to-end request budget: X-Request-Timeout-Ms header or "timeout_ms" in the
+# body, else the default, clamped to the max. Optional stages are skipped (and
+# the response marked degraded) once less than their minimum budget is left.
+REQUEST_TIMEOUT_MS = int(os.getenv("REQUEST_TIMEOUT_MS", "30000"))
+REQUEST_TIMEOUT_MAX_MS = int(os.getenv("REQUEST_TIMEOUT_MAX_MS", "120000"))
+SYNTHESIS_MIN_BUDGET_MS = int(os.getenv("SYNTHESIS_MIN_BUDGET_MS", "1500"))
+NORMALIZE_MIN_BUDGET_MS = int(os.getenv("NORMALIZE_MIN_BUDGET_MS", "2000"))
+
+# Async upsert jobs (/upsert-encounter?mode=async)
+UPSERT_WORKERS = int(os.getenv("UPSERT_WORKERS", "4"))
+UPSERT_QUEUE_MAX = int(os.getenv("UPSERT_QUEUE_MAX", "10000"))
+UPSERT_JOB_TTL = int(os.getenv("UPSERT_JOB_TTL", "86400"))
+
+# Search result cache (/search-advanced); TTL of 0 disables it
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "300"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1000"))
+
 # =========================
 # CLIENTS
 # =========================
 vector_client = cyborgdb.Client(CYBORGDB_URL, api_key=CYBORG_API_KEY)
 redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+# encounter:* values are binary (see record_codec), so they get a raw client
+record_redis = redis.from_url(REDIS_URL)
+cyborg_http = CyborgDBTransport(
+    CYBORGDB_URL,
+    CYBORG_API_KEY,
+    pool_size=CYBORGDB_POOL_SIZE,
+    connect_timeout=CYBORGDB_CONNECT_TIMEOUT,
+    read_timeout=CYBORGDB_READ_TIMEOUT,
+    max_retries=CYBORGDB_MAX_RETRIES,
+    backoff_base=CYBORGDB_RETRY_BACKOFF
+)
+
+# None in server mode: CyborgDB embeds contents / query_contents itself
+_embedder = make_embedder(EMBEDDER, EMBEDDING_MODEL, EMBEDDING_DIMENSION)
+embedder = CachedEmbedder(
+    _embedder,
+    record_redis,
+    max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+    ttl=EMBEDDING_CACHE_TTL
+) if _embedder else None
 
 # =========================
 # GEMINI
 # =========================
-genai_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+# The HTTP timeout is only a backstop so calls the governor gave up on still end
+genai_client = genai.Client(
+    api_key=os.getenv("GEMINI_API_KEY"),
+    http_options=genai.types.HttpOptions(timeout=int(max(LLM_DEADLINES.values()) * 1000))
+)
+llm_governor = LLMGovernor(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    rate_per_minute=LLM_RATE_PER_MINUTE,
+    burst=LLM_RATE_BURST,
+    default_timeout=max(LLM_DEADLINES.values()),
+    failure_threshold=LLM_BREAKER_FAILURES,
+    reset_after=LLM_BREAKER_RESET
+)
 
 # =========================
 # APP
@@ -58,48 +195,90 @@ app = Flask(__name__)
 CORS(app)
 
 # =========================
-# CYBORGDB REST
+# REQUEST DEADLINES
 # =========================
-HEADERS = {
-    "X-API-Key": CYBORG_API_KEY,
-    "Content-Type": "application/json"
-}
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout-Ms"
+
+class Deadline:
+    """
+    Absolute time budget for one request. Passed down explicitly (not via g)
+    so shard-query threads see it too; None everywhere means "no budget".
+    """
 
-def cyborgdb_upsert(items):
+    def __init__(self, budget_s):
+        self.budget = budget_s
+        self.expires_at = time.monotonic() + budget_s
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def remaining_ms(self):
+        return self.remaining() * 1000
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def cap(self, timeout):
+        # A stage's own timeout or whatever is left, whichever is smaller
+        return self.remaining() if timeout is None else min(timeout, self.remaining())
+
+def _deadline_at(deadline):
+    return deadline.expires_at if deadline is not None else None
+
+def request_deadline(headers, body=None):
+    """
+    Builds the Deadline for a request from the caller's header or body value,
+    falling back to REQUEST_TIMEOUT_MS for anything missing or invalid.
+    """
+    raw = headers.get(REQUEST_TIMEOUT_HEADER)
+    if raw is None and isinstance(body, dict):
+        raw = body.get("timeout_ms")
+
+    try:
+        budget_ms = int(raw) if raw is not None else REQUEST_TIMEOUT_MS
+    except (TypeError, ValueError):
+        budget_ms = REQUEST_TIMEOUT_MS
+
+    if budget_ms <= 0:
+        budget_ms = REQUEST_TIMEOUT_MS
+
+    return Deadline(min(budget_ms, REQUEST_TIMEOUT_MAX_MS) / 1000)
+
+# =========================
+# CYBORGDB REST
+# =========================
+def cyborgdb_upsert(items, index_name=INDEX_NAME, deadline=None):
     payload = {
-        "index_name": INDEX_NAME,
+        "index_name": index_name,
         "index_key": INDEX_KEY_BYTES.hex(),
         "items": items
     }
 
-    headers = {
-        "X-API-Key": CYBORG_API_KEY,
-        "Content-Type": "application/json"
-    }
-
-    resp = requests.post(
-        f"{CYBORGDB_URL}/v1/vectors/upsert",
-        headers=headers,
-        json=payload,
-        timeout=120
-    )
+    # Upserts are keyed by id, so replaying one is safe
+    with metrics.timed("vector_upsert"):
+        resp = cyborg_http.post("/v1/vectors/upsert", payload, idempotent=True, deadline=_deadline_at(deadline))
 
     if resp.status_code != 200:
         raise RuntimeError(resp.text)
 
     return resp.json()
 
-def delete_index_rest(index_name: str, index_key: str):
-    url = f"{CYBORGDB_URL}/v1/indexes/delete"
+def cyborgdb_query(payload, index_name=INDEX_NAME, deadline=None):
+    return cyborg_http.post("/v1/vectors/query", {
+        "index_name": index_name,
+        "index_key": INDEX_KEY_BYTES.hex(),
+        **payload
+    }, idempotent=True, deadline=_deadline_at(deadline))
 
-    resp = requests.post(
-        url,
-        headers=HEADERS,
-        json={
+def delete_index_rest(index_name: str, index_key: str):
+    resp = cyborg_http.post(
+        "/v1/indexes/delete",
+        {
             "index_name": index_name,
             "index_key": INDEX_KEY_BYTES.hex()
         },
-        timeout=120
+        idempotent=True
     )
 
     if resp.status_code == 200:
@@ -109,31 +288,145 @@ def delete_index_rest(index_name: str, index_key: str):
     else:
         raise RuntimeError(f"Delete index failed: {resp.text}")
 
-def create_index_rest(index_name: str, index_key: str):
-    url = f"{CYBORGDB_URL}/v1/indexes/create"
-
-    resp = requests.post(
-        url,
-        headers=HEADERS,
-        json={
+def create_index_rest(index_name: str, index_key: str, embedding_model=None, index_type="ivfflat"):
+    # A replayed create surfaces as 409, which is treated as success
+    resp = cyborg_http.post(
+        "/v1/indexes/create",
+        {
             "index_name": index_name,
             "index_key": INDEX_KEY_BYTES.hex(),
-            "embedding_model": "all-MiniLM-L6-v2",
+            "embedding_model": embedding_model or EMBEDDING_MODEL,
             "index_config": {
-                "type": "ivfflat"   
+                "type": index_type
             }
         },
-        timeout=120
+        idempotent=True
     )
 
     if resp.status_code == 200:
         logger.info("✅ Index ready with auto-embedding")
+        return True
     elif resp.status_code == 409:
         logger.info("✅ Index already exists")
+        return False
     else:
         raise RuntimeError(f"Create index failed: {resp.text}")
 
 
+# =========================
+# INDEX ALIAS
+# =========================
+# INDEX_NAME is a logical name. The physical index (the base of the shard
+# names) is whatever index-alias:<INDEX_NAME> points to, INDEX_NAME itself
+# until reindex.py first switches it. While a reindex is building, writes
+# are mirrored to its target and the ids remembered for it to replay.
+INDEX_ALIAS_KEY = f"index-alias:{INDEX_NAME}"
+REINDEX_KEY = f"reindex:{INDEX_NAME}"
+REINDEX_TOUCHED_KEY = f"reindex-touched:{INDEX_NAME}"
+
+_index_alias = {"checked_at": float("-inf"), "active": INDEX_NAME, "target": None}
+_index_alias_lock = threading.Lock()
+
+def refresh_index_alias(force=False):
+    """
+    Re-reads the alias and any building reindex target, at most once per
+    INDEX_ALIAS_TTL. On Redis errors the last known values stay in use.
+    """
+    if not force and time.monotonic() - _index_alias["checked_at"] < INDEX_ALIAS_TTL:
+        return
+
+    with _index_alias_lock:
+        if not force and time.monotonic() - _index_alias["checked_at"] < INDEX_ALIAS_TTL:
+            return
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.get(INDEX_ALIAS_KEY)
+            pipe.hmget(REINDEX_KEY, "state", "target")
+            active, (state, target) = pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Index alias refresh failed: %s", e)
+        else:
+            _index_alias["active"] = active or INDEX_NAME
+            _index_alias["target"] = target if state in ("building", "switched") else None
+        _index_alias["checked_at"] = time.monotonic()
+
+def active_index_base():
+    refresh_index_alias()
+    return _index_alias["active"]
+
+def reindex_target_base():
+    # The index a reindex is building, while writes must be mirrored to it
+    refresh_index_alias()
+    target = _index_alias["target"]
+    return target if target != _index_alias["active"] else None
+
+# =========================
+# SHARDING
+# =========================
+def shard_index_name(shard, base=None):
+    return f"{base or active_index_base()}-shard-{shard}"
+
+def all_index_names(base=None):
+    base = base or active_index_base()
+    if INDEX_SHARDS <= 0:
+        return [base]
+    return [shard_index_name(n, base) for n in range(INDEX_SHARDS)]
+
+def index_for_hospital(hospital_id, base=None):
+    base = base or active_index_base()
+    if INDEX_SHARDS <= 0:
+        return base
+
+    hospital_id = str(hospital_id)
+    if hospital_id in INDEX_SHARD_MAP:
+        return shard_index_name(int(INDEX_SHARD_MAP[hospital_id]) % INDEX_SHARDS, base)
+
+    # Stable across processes and restarts (unlike hash())
+    digest = hashlib.sha1(hospital_id.encode()).hexdigest()
+    return shard_index_name(int(digest[:8], 16) % INDEX_SHARDS, base)
+
+def route_items(routed_items, base=None):
+    # [(hospital_id, item)] -> {index_name: [item]}
+    by_index = {}
+    for hospital_id, item in routed_items:
+        by_index.setdefault(index_for_hospital(hospital_id, base), []).append(item)
+    return by_index
+
+def mirror_to_reindex(routed_items):
+    """
+    Dual-write while a reindex builds. The ids go into a set the reindex
+    replays from Redis before and after switching, so a failed mirror
+    write (or one racing the copy) is repaired there.
+    """
+    target = reindex_target_base()
+    if target is None or not routed_items:
+        return
+
+    try:
+        redis_client.sadd(REINDEX_TOUCHED_KEY, *(
+            item["id"].replace("encounter:", "", 1) for _, item in routed_items
+        ))
+        for index_name, items in route_items(routed_items, target).items():
+            cyborgdb_upsert(items, index_name=index_name)
+    except Exception as e:
+        logger.warning("Reindex dual-write failed (will be replayed): %s", e)
+
+def upsert_vectors(routed_items, deadline=None):
+    """
+    Upserts [(hospital_id, item)] pairs, grouped into one call per shard.
+    """
+    for index_name, items in route_items(routed_items).items():
+        cyborgdb_upsert(items, index_name=index_name, deadline=deadline)
+
+    mirror_to_reindex(routed_items)
+
+# Shared by every request: each global search holds INDEX_SHARDS workers,
+# so size it for concurrent searches, not for one
+shard_pool = ThreadPoolExecutor(
+    max_workers=max(1, INDEX_SHARDS, SHARD_QUERY_WORKERS or CYBORGDB_POOL_SIZE),
+    thread_name_prefix="shard-query"
+)
+
 # =========================
 # SECURITY HELPERS
 # =========================
@@ -146,44 +439,281 @@ def decrypt_metadata(token):
     except Exception:
         return {}
 
+def hospital_tag(hospital_id):
+    """
+    Keyed, filterable stand-in for hospital_id stored in plaintext vector
+    metadata, so the vector service can scope queries without seeing the id.
+    """
+    return hmac.new(CONSORTIUM_KEY, str(hospital_id).encode(), hashlib.sha256).hexdigest()[:32]
+
+# =========================
+# ENCOUNTER RECORDS
+# =========================
+_migrate_record = record_redis.register_script(record_codec.MIGRATE_SCRIPT)
+
+def encounter_key(encounter_id):
+    return f"encounter:{encounter_id}"
+
+def card_key(encounter_id):
+    return f"encounter-card:{encounter_id}"
+
+def flatten_record(record):
+    # Combine raw_encounter + summary for a consistent format
+    raw = record.get("raw_encounter", record)
+    summary = record.get("summary", {})
+    return {**raw, **summary}
+
+def build_search_card(record):
+    """
+    Small projection of an encounter with just what search renders and
+    synthesis reads. Works on stored records and on flattened encounters.
+    """
+    flat = flatten_record(record)
+
+    diagnoses = flat.get("diagnoses")
+    if not diagnoses and flat.get("diagnosis"):
+        diagnoses = [flat["diagnosis"]]
+
+    return {
+        "_id": flat.get("_id"),
+        "hospital": flat.get("hospital"),
+        "startedAt": flat.get("startedAt") or flat.get("encounter_date"),
+        "diagnoses": diagnoses or [],
+        "chief_complaint": flat.get("chief_complaint") or flat.get("chiefComplaint"),
+        "treatment": flat.get("treatment") or flat.get("plan_and_outcome"),
+        "outcome": flat.get("outcome") or flat.get("plan_and_outcome"),
+        "medications": flat.get("medications", [])
+    }
+
+# Commands queued per save_record() call, for callers reading pipeline replies
+RECORD_WRITES = 2
+
+def save_record(encounter_id, record, pipe=None):
+    """
+    Writes the full record and its search card together.
+    """
+    target = pipe or record_redis.pipeline(transaction=False)
+    target.set(encounter_key(encounter_id), record_codec.encode(record))
+    target.set(card_key(encounter_id), record_codec.encode(build_search_card(record)))
+
+    if pipe is None:
+        with metrics.timed("redis_write"):
+            target.execute()
+
+def load_records(encounter_ids):
+    """
+    MGETs and decodes encounter records (None where missing). Legacy JSON
+    values are rewritten in the current format on the way out.
+    """
+    if not encounter_ids:
+        return []
+
+    keys = [encounter_key(eid) for eid in encounter_ids]
+    records, legacy = [], []
+
+    for key, blob in zip(keys, record_redis.mget(keys)):
+        record = record_codec.decode(blob)
+        records.append(record)
+        if blob is not None and record_codec.is_legacy(blob):
+            legacy.append((key, blob, record))
+
+    if legacy:
+        _migrate_legacy_records(legacy)
+
+    return records
+
+def load_cards(encounter_ids):
+    """
+    MGETs search cards. Records stored before cards existed are projected
+    from the full record once and the card is backfilled.
+    """
+    if not encounter_ids:
+        return []
+
+    cards = [
+        record_codec.decode(blob)
+        for blob in record_redis.mget([card_key(eid) for eid in encounter_ids])
+    ]
+
+    missing = [i for i, card in enumerate(cards) if card is None]
+    if missing:
+        records = load_records([encounter_ids[i] for i in missing])
+        pipe = record_redis.pipeline(transaction=False)
+
+        for i, record in zip(missing, records):
+            if record is None:
+                continue
+            cards[i] = build_search_card(record)
+            pipe.set(card_key(encounter_ids[i]), record_codec.encode(cards[i]))
+
+        pipe.execute()
+
+    return cards
+
+def _migrate_legacy_records(legacy):
+    try:
+        pipe = record_redis.pipeline(transaction=False)
+        for key, blob, record in legacy:
+            _migrate_record(keys=[key], args=[blob, record_codec.encode(record)], client=pipe)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Record migration failed: %s", e)
+
+# =========================
+# SEARCH CACHE
+# =========================
+class SearchCache:
+    """
+    Bounded, TTL'd LRU of /search-advanced responses.
+    Keys embed a Redis generation counter, so bumping the counter on upsert
+    invalidates stale entries in every worker process at once.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+search_cache = SearchCache(SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL)
+
+def _search_generation_key(hospital_id=None):
+    if hospital_id is None:
+        return "search-cache:gen:global"
+    return f"search-cache:gen:hospital:{hospital_id}"
+
+def normalize_search_key(query_text, scope, hospital_id):
+    normalized_query = " ".join(str(query_text).lower().split())
+
+    # Global results don't depend on the caller, so every hospital shares them
+    if scope != "local":
+        hospital_id = None
+
+    return normalized_query, scope or "global", hospital_id
+
+def search_cache_key(query_text, scope, hospital_id, view=(False, ())):
+    normalized_query, scope, hospital_id = normalize_search_key(query_text, scope, hospital_id)
+    generation = redis_client.get(_search_generation_key(hospital_id)) or "0"
+
+    # Results from before an index switch never match after it
+    return (normalized_query, scope, hospital_id, view, generation, active_index_base())
+
+def invalidate_search_cache(hospital_ids):
+    """
+    Any write can change global results; local results only change for the
+    hospitals that were written to.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.incr(_search_generation_key())
+    for hospital_id in set(hospital_ids):
+        pipe.incr(_search_generation_key(hospital_id))
+    pipe.execute()
+
 # =========================
 # DB SETUP
 # =========================
-logger.info(f"🔌 Connecting to index: {INDEX_NAME}")
+def index_exists(index_name):
+    """
+    Returns True/False, or None when the service can't list indexes.
+    """
+    try:
+        resp = cyborg_http.get("/v1/indexes/list")
+    except requests.exceptions.RequestException as e:
+        logger.warning("Index listing failed: %s", e)
+        return None
+
+    if not resp.ok:
+        return None
 
-try:
-    delete_index_rest(INDEX_NAME, INDEX_KEY_BYTES)
-    time.sleep(1)
-    logger.info("   - Cleared existing index")
-except Exception:
-    logger.info("   - No index to delete")
+    return index_name in resp.json().get("indexes", [])
 
-try:
-    config = IndexIVFFlatModel(
-        dimension=768,
-        metric="cosine",
-        embedding_model="sentence-transformers/all-mpnet-base-v2"
-    )
-    create_index_rest(INDEX_NAME, INDEX_KEY_BYTES)
-    logger.info("✅ Index ready with auto-embedding")
-except Exception as e:
-    if "already exists" in str(e):
-        logger.info("✅ Index already exists")
-    else:
-        raise
+def ensure_index(index_name):
+    """
+    Reuses an existing index and only creates it when missing.
+    Returns True when a new (empty) index was created.
+    """
+    if index_exists(index_name):
+        logger.info(f"♻️  Reusing existing index: {index_name}")
+        return False
+
+    return create_index_rest(index_name, INDEX_KEY_BYTES)
+
+config = IndexIVFFlatModel(
+    dimension=768,
+    metric="cosine",
+    embedding_model="sentence-transformers/all-mpnet-base-v2"
+)
+
+index_created = False
+for _index_name in all_index_names():
+    logger.info(f"🔌 Connecting to index: {_index_name}")
+    index_created = ensure_index(_index_name) or index_created
 
 # =========================
 # AUTO SEED
 # =========================
-def seed_database():
+SEED_HASHES_KEY = f"seed-hashes:{INDEX_NAME}"
+
+def seed_semantic_text(payload):
+    return f"{payload.get('diagnosis')} {payload.get('chiefComplaint')} {' '.join(payload.get('medications') or [])}"
+
+def case_hash(case):
+    return hashlib.sha256(json.dumps(case, sort_keys=True).encode()).hexdigest()
+
+def seed_database(force=False):
     """
     Seeds demo encounters into Redis and CyborgDB with full structured payloads.
+    Idempotent: a content hash per encounter is kept in Redis and only new or
+    changed cases are written, unless `force` is set.
     """
     logger.info("🌱 Seeding demo encounters...")
 
-    batch = []
+    hashes = {case["encounter_id"]: case_hash(case) for case in MOCK_DATA}
 
-    for case in MOCK_DATA:
+    if force:
+        stored = [None] * len(MOCK_DATA)
+    else:
+        stored = redis_client.hmget(SEED_HASHES_KEY, [case["encounter_id"] for case in MOCK_DATA])
+
+    changed = [
+        case for case, old in zip(MOCK_DATA, stored)
+        if old != hashes[case["encounter_id"]]
+    ]
+
+    if not changed:
+        logger.info("✨ Seed data unchanged, nothing to do")
+        return 0
+
+    texts = []
+    pipe = record_redis.pipeline(transaction=False)
+
+    for case in changed:
         # Build a full encounter payload
         payload = {
             "_id": case["encounter_id"],
@@ -261,24 +791,121 @@ def seed_database():
         }
 
         # Create searchable text for CyborgDB
-        text = f"{payload['diagnosis']} {payload['chiefComplaint']} {' '.join(payload['medications'])}"
-        meta = encrypt_metadata({"hospital_id": case["hospital_id"]})
+        text = seed_semantic_text(payload)
 
         # Save to Redis
-        redis_client.set(f"encounter:{case['encounter_id']}", json.dumps(payload))
+        save_record(case["encounter_id"], payload, pipe=pipe)
 
         # Prepare batch for CyborgDB upsert
-        batch.append({
-            "id": f"encounter:{case['encounter_id']}",
-            "contents": text,
-            "metadata": {"secure_blob": meta}
-        })
+        texts.append((case, text))
+
+    pipe.execute()
+
+    vectors = embed_texts([text for _, text in texts])
+    batch = [
+        (case["hospital_id"], build_vector_item(case["encounter_id"], case["hospital_id"], text, vector))
+        for (case, text), vector in zip(texts, vectors)
+    ]
 
     # Upsert into CyborgDB
-    cyborgdb_upsert(batch)
-    logger.info(f"✨ Seeded {len(batch)} encounters")
+    upsert_vectors(batch)
+    index_lexical([
+        (case["encounter_id"], case["hospital_id"], text) for case, text in texts
+    ])
+    invalidate_search_cache(case["hospital_id"] for case in changed)
+
+    # Record hashes only once the vectors are in, so a failed run is retried
+    redis_client.hset(SEED_HASHES_KEY, mapping={
+        case["encounter_id"]: hashes[case["encounter_id"]] for case in changed
+    })
+
+    logger.info(f"✨ Seeded {len(batch)} encounters ({len(MOCK_DATA) - len(batch)} unchanged)")
+    return len(batch)
+
+# =========================
+# LLM RESPONSE CACHE
+# =========================
+LLM_CACHE_STATS_KEY = "llm-cache:stats"
+
+def _llm_cache_key(model, prompt):
+    digest = hashlib.sha256(f"{model}\0{prompt}".encode()).hexdigest()
+    return f"llm-cache:{digest}"
+
+def _llm_cache_count(purpose, outcome):
+    try:
+        redis_client.hincrby(LLM_CACHE_STATS_KEY, f"{purpose}:{outcome}", 1)
+    except redis.RedisError:
+        pass
 
-seed_database()
+def llm_generate(prompt, parse, purpose, model=GEMINI_MODEL, deadline=None):
+    """
+    Runs `prompt` through Gemini and returns parse(text).
+    Raw replies are cached in Redis under a hash of model + prompt, but only
+    after `parse` accepts them; parse errors and API errors propagate so the
+    caller's fallback is never cached. Provider calls go through
+    llm_governor, which raises LLMUnavailable instead of queueing forever;
+    a request deadline further caps the per-purpose timeout.
+    """
+    key = _llm_cache_key(model, prompt)
+
+    if LLM_CACHE_TTL > 0:
+        try:
+            cached = redis_client.get(key)
+        except redis.RedisError as e:
+            logger.warning("LLM cache read failed: %s", e)
+            cached = None
+
+        if cached is not None:
+            try:
+                result = parse(cached)
+                _llm_cache_count(purpose, "hits")
+                metrics.cache_lookup("llm", hit=True)
+                return result
+            except Exception:
+                try:
+                    redis_client.delete(key)
+                except redis.RedisError as e:
+                    logger.warning("LLM cache delete failed: %s", e)
+
+        _llm_cache_count(purpose, "misses")
+        metrics.cache_lookup("llm", hit=False)
+
+    timeout = LLM_DEADLINES.get(purpose)
+    if deadline is not None:
+        if deadline.expired:
+            raise LLMUnavailable("request deadline exceeded")
+        timeout = deadline.cap(timeout)
+
+    # Running out of the caller's budget says nothing about Gemini's health
+    own_deadline = timeout == LLM_DEADLINES.get(purpose)
+
+    metrics.in_flight.inc(name=f"llm_{purpose}")
+    try:
+        with metrics.timed(f"llm_{purpose}"):
+            res = llm_governor.call(
+                lambda: genai_client.models.generate_content(
+                    model=model,
+                    contents=prompt
+                ),
+                timeout=timeout,
+                trip_on_timeout=own_deadline
+            )
+    finally:
+        metrics.in_flight.dec(name=f"llm_{purpose}")
+    text = res.text
+    result = parse(text)
+
+    if LLM_CACHE_TTL > 0:
+        try:
+            redis_client.set(key, text, ex=LLM_CACHE_TTL)
+        except redis.RedisError as e:
+            logger.warning("LLM cache write failed: %s", e)
+
+    return result
+
+def llm_cache_stats():
+    stats = redis_client.hgetall(LLM_CACHE_STATS_KEY)
+    return {k: int(v) for k, v in stats.items()}
 
 # =========================
 # REASONING
@@ -293,19 +920,59 @@ def stringify_object_ids(obj):
     else:
         return obj
 
-def synthesize_answer(query, encounters):
+def parse_synthesis(text):
+    if not text or "[INSIGHTS]" not in text:
+        raise RuntimeError("Malformed Gemini synthesis")
+
+    def extract(tag):
+        return text.split(tag)[1].split("[", 1)[0].strip() if tag in text else "N/A"
+
+    return {
+        "clinical_insights": extract("[INSIGHTS]"),
+        "management_outcomes": extract("[MANAGEMENT]"),
+        "suggested_next_steps": extract("[NEXT_STEPS]")
+    }
+
+def parse_normalized(text):
+    if not text:
+        raise RuntimeError("Empty Gemini response")
+
+    text = text.strip()
+
+    if text.startswith("```"):
+        text = text.split("```")[1]
+
+    start = text.find("{")
+    end = text.rfind("}")
+
+    if start == -1 or end == -1:
+        raise RuntimeError("No JSON object found")
+
+    clean_json = text[start:end + 1]
+
+    normalized = json.loads(clean_json)
+
+    if not isinstance(normalized, dict):
+        raise RuntimeError("Normalization is not a JSON object")
+
+    return normalized
+
+SYNTHESIS_FALLBACK = {
+    "clinical_insights": "Unavailable",
+    "management_outcomes": "N/A",
+    "suggested_next_steps": "Manual review required"
+}
+
+def build_synthesis_prompt(query, encounters):
     evidence = ""
 
     for i, e in enumerate(encounters):
-        enc = e["encounter"]
-
-        raw = enc.get("raw_encounter", {})
-        summary = enc.get("summary", {})
+        card = build_search_card(e["encounter"])
 
-        diagnosis = summary.get("diagnoses", [])
-        chief_complaint = summary.get("chief_complaint", "-")
-        treatment = raw.get("treatment", "N/A")
-        outcome = raw.get("outcome", "N/A")
+        diagnosis = card["diagnoses"]
+        chief_complaint = card["chief_complaint"] or "-"
+        treatment = card["treatment"] or "N/A"
+        outcome = card["outcome"] or "N/A"
 
         if isinstance(diagnosis, list):
             diagnosis = ", ".join(diagnosis)
@@ -317,7 +984,7 @@ def synthesize_answer(query, encounters):
             f"Complaint={chief_complaint}\n"
         )
 
-    prompt = f"""
+    return f"""
 You are a senior clinical AI.
 
 Doctor Query: "{query}"
@@ -331,32 +998,18 @@ Return exactly:
 [NEXT_STEPS]
 """
 
-    try:
-        res = genai_client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt
-        )
-        text = res.text
-
-        def extract(tag):
-            return text.split(tag)[1].split("[", 1)[0].strip() if tag in text else "N/A"
+def synthesize_answer(query, encounters, deadline=None):
+    prompt = build_synthesis_prompt(query, encounters)
 
-        return {
-            "clinical_insights": extract("[INSIGHTS]"),
-            "management_outcomes": extract("[MANAGEMENT]"),
-            "suggested_next_steps": extract("[NEXT_STEPS]")
-        }
+    try:
+        return llm_generate(prompt, parse_synthesis, purpose="synthesize", deadline=deadline)
 
     except Exception as e:
         logger.error(e)
-        return {
-            "clinical_insights": "Unavailable",
-            "management_outcomes": "N/A",
-            "suggested_next_steps": "Manual review required"
-        }
+        return dict(SYNTHESIS_FALLBACK)
 
-def normalize_encounter_with_gemini(encounter: dict) -> dict:
-    prompt = f"""
+def build_normalization_prompt(encounter):
+    return f"""
 You are a clinical data normalization engine.
 
 Return ONLY valid JSON.
@@ -377,52 +1030,206 @@ Encounter JSON:
 {json.dumps(encounter, indent=2)}
 """
 
+def normalization_fallback(encounter):
+    return {
+        "narrative_summary": "",
+        "diagnoses": [],
+        "chief_complaint": encounter.get("chief_complaint", ""),
+        "key_findings": "",
+        "medications": [],
+        "abnormal_labs": [],
+        "imaging_findings": [],
+        "plan_and_outcome": ""
+    }
+
+def normalize_encounter_with_gemini(encounter: dict, deadline=None) -> tuple:
+    """
+    Returns (normalized, from_llm); from_llm is False when the fallback
+    summary was used, so callers don't treat it as a settled result.
+    """
+    prompt = build_normalization_prompt(encounter)
+
     try:
-        res = genai_client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt
-        )
+        return llm_generate(prompt, parse_normalized, purpose="normalize", deadline=deadline), True
+
+    except Exception as e:
+        logger.error("Gemini normalization failed: %s", e)
+        return normalization_fallback(encounter), False
+
+def build_batch_normalization_prompt(keyed_encounters):
+    return f"""
+You are a clinical data normalization engine.
+
+You are given several encounters, each under its own key.
+Return ONLY one valid JSON object mapping every key to that encounter's
+normalized object.
+Do NOT include markdown.
+Do NOT include explanations.
+
+Required keys of each normalized object:
+- narrative_summary
+- diagnoses
+- chief_complaint
+- key_findings
+- medications
+- abnormal_labs
+- imaging_findings
+- plan_and_outcome
 
-        text = res.text
+Encounters JSON:
+{json.dumps(keyed_encounters)}
+"""
 
-        if not text:
-            raise RuntimeError("Empty Gemini response")
+def parse_batch_normalized(text):
+    """
+    Returns {key: normalized} for the entries that parsed; raises only when
+    the reply holds no usable entry at all.
+    """
+    batch = parse_normalized(text)
+    parsed = {k: v for k, v in batch.items() if isinstance(v, dict)}
+
+    if not parsed:
+        raise RuntimeError("Batch normalization has no usable entries")
 
-        text = text.strip()
+    return parsed
 
-        if text.startswith("```"):
-            text = text.split("```")[1]
+def pack_normalization_batches(encounters):
+    """
+    Greedily groups encounter indexes into batches of at most
+    NORMALIZE_BATCH_SIZE items and NORMALIZE_BATCH_MAX_CHARS of payload.
+    An encounter over the limit on its own gets a batch of one.
+    """
+    batches, current, size = [], [], 0
 
-        start = text.find("{")
-        end = text.rfind("}")
+    for i, encounter in enumerate(encounters):
+        length = len(json.dumps(encounter))
+        if current and (len(current) >= NORMALIZE_BATCH_SIZE or size + length > NORMALIZE_BATCH_MAX_CHARS):
+            batches.append(current)
+            current, size = [], 0
+        current.append(i)
+        size += length
 
-        if start == -1 or end == -1:
-            raise RuntimeError("No JSON object found")
+    if current:
+        batches.append(current)
+    return batches
 
-        clean_json = text[start:end + 1]
+def normalize_encounters_batch(encounters):
+    """
+    Normalizes several encounters with one prompt and returns a
+    (normalized, from_llm) pair per encounter, in order. Entries missing
+    from the reply (or the whole batch, if it can't be parsed) fall back
+    to single-encounter calls.
+    """
+    if len(encounters) == 1:
+        return [normalize_encounter_with_gemini(encounters[0])]
 
-        return json.loads(clean_json)
+    keys = [f"E{i}" for i in range(len(encounters))]
+    prompt = build_batch_normalization_prompt(dict(zip(keys, encounters)))
 
+    try:
+        parsed = llm_generate(prompt, parse_batch_normalized, purpose="normalize_batch")
     except Exception as e:
-        logger.error("Gemini normalization failed: %s", e)
+        logger.warning("Batch normalization of %d encounters failed, going one by one: %s", len(encounters), e)
+        parsed = {}
+
+    results = []
+    for key, encounter in zip(keys, encounters):
+        if key in parsed:
+            results.append((parsed[key], True))
+        else:
+            results.append(normalize_encounter_with_gemini(encounter))
+    return results
 
+# =========================
+# CHANGE DETECTION
+# =========================
+# Bookkeeping fields the backend bumps on every save. They never reach the
+# summary or the vector, so a change to them alone is not a change.
+FINGERPRINT_IGNORED_FIELDS = frozenset({
+    "updatedAt", "createdAt", "__v", "updatedBy", "lastModified", "lastModifiedBy"
+})
+
+def fingerprint_key(encounter_id):
+    return f"encounter-fp:{encounter_id}"
+
+def _clinical_view(value):
+    # Canonical copy: ignored fields dropped, keys sorted at every level
+    if isinstance(value, dict):
         return {
-            "narrative_summary": "",
-            "diagnoses": [],
-            "chief_complaint": encounter.get("chief_complaint", ""),
-            "key_findings": "",
-            "medications": [],
-            "abnormal_labs": [],
-            "imaging_findings": [],
-            "plan_and_outcome": ""
+            k: _clinical_view(value[k])
+            for k in sorted(value)
+            if k not in FINGERPRINT_IGNORED_FIELDS
         }
-    
+    if isinstance(value, list):
+        return [_clinical_view(v) for v in value]
+    return value
+
+def normalization_fingerprint(encounter):
+    """
+    Hash of exactly what the LLM would be asked (model + prompt over the
+    clinical view), so a prompt or model change re-normalizes by itself.
+    """
+    prompt = build_normalization_prompt(_clinical_view(encounter))
+    return hashlib.sha256(f"{GEMINI_MODEL}\n{prompt}".encode()).hexdigest()
+
+def vector_fingerprint(hospital_id, semantic_text, base=None):
+    # Embedded text plus where the vector lives, how it is tagged and who embeds it
+    vector_space = embedder.name if embedder else f"server-{EMBEDDING_MODEL}"
+    material = f"{index_for_hospital(hospital_id, base)}\n{hospital_tag(hospital_id)}\n{vector_space}\n{semantic_text}"
+    return hashlib.sha256(material.encode()).hexdigest()
+
+def load_fingerprints(encounter_ids):
+    pipe = redis_client.pipeline(transaction=False)
+    for encounter_id in encounter_ids:
+        pipe.hgetall(fingerprint_key(encounter_id))
+    return pipe.execute()
+
+def store_fingerprints(entries):
+    """
+    entries: [(encounter_id, normalize_fp, vector_fp)]. A None normalize_fp
+    clears the stored one, so a fallback summary is retried next time.
+    """
+    if not entries:
+        return
+
+    pipe = redis_client.pipeline(transaction=False)
+    for encounter_id, normalize_fp, vector_fp in entries:
+        key = fingerprint_key(encounter_id)
+        pipe.hset(key, "vector", vector_fp)
+        if normalize_fp:
+            pipe.hset(key, "normalize", normalize_fp)
+        else:
+            pipe.hdel(key, "normalize")
+    pipe.execute()
+
+def reusable_summaries(encounter_ids, fingerprints, normalize_fps):
+    """
+    Stored summaries for encounters whose normalization input is unchanged
+    (None elsewhere, including when the record itself has gone missing).
+    """
+    reuse = [
+        i for i, (fp, new_fp) in enumerate(zip(fingerprints, normalize_fps))
+        if fp.get("normalize") == new_fp
+    ]
+    summaries = [None] * len(encounter_ids)
+
+    records = load_records([encounter_ids[i] for i in reuse])
+    for i, record in zip(reuse, records):
+        if record and record.get("summary"):
+            summaries[i] = record["summary"]
+
+    return summaries
+
 # =========================
-# ROUTES
+# INGEST HELPERS
 # =========================
-@app.route("/upsert-encounter", methods=["POST"])
-def upsert_encounter():
-    raw_encounter = request.json
+def prepare_encounter(raw_encounter):
+    """
+    Validates an incoming encounter and returns (encounter, encounter_id, hospital_id).
+    Raises ValueError when the encounter cannot be stored.
+    """
+    if not isinstance(raw_encounter, dict):
+        raise ValueError("encounter must be a JSON object")
 
     encounter = stringify_object_ids(raw_encounter)
 
@@ -430,25 +1237,18 @@ def upsert_encounter():
     hospital_id = encounter.get("hospital")
 
     if not encounter_id or not hospital_id:
-        return jsonify({"error": "encounter_id or hospital_id missing"}), 400
+        raise ValueError("encounter_id or hospital_id missing")
 
-    encounter["_id"] = str(encounter_id)
-    encounter["hospital"] = str(hospital_id)
+    encounter_id = str(encounter_id)
+    hospital_id = str(hospital_id)
 
-    # 1. Normalize using Gemini
-    normalized = normalize_encounter_with_gemini(encounter)
+    encounter["_id"] = encounter_id
+    encounter["hospital"] = hospital_id
 
-    # 2. Store structured summary in Redis
-    redis_client.set(
-        f"encounter:{encounter_id}",
-        json.dumps({
-            "raw_encounter": encounter,
-            "summary": normalized
-        })
-    )
+    return encounter, encounter_id, hospital_id
 
-    # 3. Build semantic text
-    semantic_text = f"""
+def build_semantic_text(normalized):
+    return f"""
 Chief Complaint:
 {normalized.get('chief_complaint', '-')}
 
@@ -471,102 +1271,1171 @@ Plan & Outcome:
 {normalized.get("plan_and_outcome", "-")}
 """
 
-    # 4. Encrypt metadata 
+def embed_texts(texts):
+    """
+    Vectors for `texts` through the embedding cache, or Nones in server mode.
+    Batch callers embed everything in one go and pass the vectors along.
+    """
+    if embedder is None or not texts:
+        return [None] * len(texts)
+    return embedder.embed(list(texts))
+
+def build_vector_item(encounter_id, hospital_id, semantic_text, vector=None):
     meta = encrypt_metadata({
         "hospital_id": hospital_id,
         "encounter_id": encounter_id
     })
 
-    # 5. Upsert into CyborgDB (AUTO EMBEDDING)
-    cyborgdb_upsert([{
+    if vector is None and embedder is not None:
+        vector = embed_texts([semantic_text])[0]
+
+    item = {
         "id": f"encounter:{encounter_id}",
-        "contents": semantic_text,
         "metadata": {
-            "secure_blob": meta
+            "secure_blob": meta,
+            "hospital_tag": hospital_tag(hospital_id)
         }
-    }])
+    }
 
-    return jsonify({
+    # A precomputed vector replaces server-side embedding of the contents
+    if vector is not None:
+        item["vector"] = vector
+    else:
+        item["contents"] = semantic_text
+
+    return item
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def process_encounter(encounter, encounter_id, hospital_id, deadline=None):
+    skipped, degraded = [], []
+    fingerprints = load_fingerprints([encounter_id])
+
+    # 1. Normalize using Gemini, unless the clinical input is unchanged.
+    #    Too little budget left: store the fallback now, re-normalize next save.
+    normalize_fp = normalization_fingerprint(encounter)
+    normalized = reusable_summaries([encounter_id], fingerprints, [normalize_fp])[0]
+
+    if normalized is not None:
+        skipped.append("normalize")
+    elif deadline is not None and deadline.remaining_ms() < NORMALIZE_MIN_BUDGET_MS:
+        normalized, normalize_fp = normalization_fallback(encounter), None
+        degraded.append("normalize")
+    else:
+        normalized, from_llm = normalize_encounter_with_gemini(encounter, deadline)
+        if not from_llm:
+            normalize_fp = None
+            degraded.append("normalize")
+
+    # 2. Store structured summary in Redis
+    save_record(encounter_id, {
+        "raw_encounter": encounter,
+        "summary": normalized
+    })
+
+    # 3. Build semantic text
+    semantic_text = build_semantic_text(normalized)
+    vector_fp = vector_fingerprint(hospital_id, semantic_text)
+
+    # 4. Encrypt metadata + 5. Upsert into CyborgDB (AUTO EMBEDDING), unless unchanged
+    if fingerprints[0].get("vector") == vector_fp:
+        skipped.append("vector_upsert")
+    else:
+        upsert_vectors(
+            [(hospital_id, build_vector_item(encounter_id, hospital_id, semantic_text))],
+            deadline
+        )
+
+    store_fingerprints([(encounter_id, normalize_fp, vector_fp)])
+    if "vector_upsert" not in skipped:
+        index_lexical([(encounter_id, hospital_id, semantic_text)])
+
+    # Cards and rankings only move when the clinical view or the vector did
+    if len(skipped) < 2:
+        invalidate_search_cache([hospital_id])
+
+    return {
         "status": "stored",
-        "encounter_id": encounter_id
+        "encounter_id": encounter_id,
+        "skipped": skipped,
+        "degraded": bool(degraded),
+        "degraded_stages": degraded
+    }
+
+# =========================
+# LEXICAL INDEX
+# =========================
+# Each process keeps its own index. Updates are applied locally and appended
+# to a capped Redis stream that every process tails, so writes handled by
+# other workers (or the async mirror) reach all of them.
+LEXICAL_LOG_KEY = "lexical-index:log"
+LEXICAL_SCAN_BATCH = 1000
+
+lexical_index = LexicalIndex()
+lexical_state = {"ready": False, "rebuilt_docs": 0, "applied_updates": 0}
+_lexical_thread = None
+_lexical_lock = threading.Lock()
+
+def index_lexical(entries):
+    """
+    Indexes [(encounter_id, hospital_id, semantic_text)] here and publishes
+    them to the other processes. Best effort: search never depends on it.
+    """
+    if not LEXICAL_INDEX or not entries:
+        return
+
+    for encounter_id, hospital_id, text in entries:
+        lexical_index.add(encounter_id, hospital_id, text)
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for encounter_id, hospital_id, text in entries:
+            pipe.xadd(
+                LEXICAL_LOG_KEY,
+                {"id": encounter_id, "hospital": hospital_id, "text": text},
+                maxlen=LEXICAL_LOG_MAXLEN,
+                approximate=True
+            )
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Lexical update not published: %s", e)
+
+def record_semantic_text(record):
+    # The text the record was embedded with: normalized summary, or the seed text
+    if "summary" in record:
+        return build_semantic_text(record["summary"])
+    return seed_semantic_text(record)
+
+def rebuild_lexical_index():
+    """
+    Loads every stored encounter into the index with SCAN + MGET batches.
+    """
+    started = time.perf_counter()
+    count = 0
+
+    for keys in _scan_batches(record_redis, "encounter:*", LEXICAL_SCAN_BATCH):
+        eids = [key.decode()[len("encounter:"):] for key in keys]
+        for eid, record in zip(eids, load_records(eids)):
+            if record is None:
+                continue
+            hospital_id = flatten_record(record).get("hospital")
+            lexical_index.add(eid, str(hospital_id), record_semantic_text(record))
+            count += 1
+
+    lexical_state["rebuilt_docs"] = count
+    logger.info(f"🔤 Lexical index rebuilt: {count} encounters in {time.perf_counter() - started:.1f}s")
+
+def _scan_batches(client, pattern, count):
+    batch = []
+    for key in client.scan_iter(match=pattern, count=count):
+        batch.append(key)
+        if len(batch) >= count:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _lexical_loop():
+    # Remember the stream position first, so updates made during the rebuild
+    # are replayed afterwards rather than lost
+    while True:
+        try:
+            latest = redis_client.xrevrange(LEXICAL_LOG_KEY, count=1)
+            last_id = latest[0][0] if latest else "0-0"
+            rebuild_lexical_index()
+            break
+        except Exception as e:
+            logger.error("Lexical index rebuild failed: %s", e)
+            time.sleep(5)
+
+    lexical_state["ready"] = True
+
+    while True:
+        try:
+            for _, entries in redis_client.xread({LEXICAL_LOG_KEY: last_id}, count=500, block=5000) or []:
+                for entry_id, fields in entries:
+                    lexical_index.add(fields["id"], fields["hospital"], fields["text"])
+                    last_id = entry_id
+                    lexical_state["applied_updates"] += 1
+        except Exception as e:
+            logger.error("Lexical index feed error: %s", e)
+            time.sleep(1)
+
+def ensure_lexical_index():
+    """
+    Starts the rebuild + feed thread once per process, lazily like the
+    upsert workers.
+    """
+    global _lexical_thread
+    if _lexical_thread is not None or not LEXICAL_INDEX:
+        return
+
+    with _lexical_lock:
+        if _lexical_thread is not None:
+            return
+        _lexical_thread = threading.Thread(target=_lexical_loop, name="lexical-index", daemon=True)
+        _lexical_thread.start()
+
+def lexical_stats():
+    if not LEXICAL_INDEX:
+        return None
+    return {**lexical_state, **lexical_index.stats()}
+
+# =========================
+# UPSERT JOBS
+# =========================
+UPSERT_QUEUE_KEY = "upsert-jobs:queue"
+# A worker BLMOVEs the job it runs onto its own processing list, so a crash
+# or redeploy never loses it: lists of processes that stopped heartbeating
+# are pushed back onto the queue (see reclaim_upsert_jobs)
+UPSERT_LISTS_KEY = "upsert-jobs:processing-lists"
+UPSERT_HEARTBEAT_TTL = 30
+UPSERT_JOB_MAX_ATTEMPTS = 3
+# Held per encounter while its job runs; outlives any single job
+UPSERT_LOCK_TTL = 300
+
+_upsert_workers = []
+_upsert_workers_lock = threading.Lock()
+
+_release_upsert_lock = redis_client.register_script(
+    "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+)
+
+def _job_key(job_id):
+    return f"job:{job_id}"
+
+def _processing_key(process_id, n):
+    return f"upsert-jobs:processing:{process_id}:{n}"
+
+def _alive_key(process_id):
+    return f"upsert-jobs:alive:{process_id}"
+
+def _latest_job_key(encounter_id):
+    return f"upsert-jobs:latest:{encounter_id}"
+
+def _encounter_lock_key(encounter_id):
+    return f"upsert-jobs:lock:{encounter_id}"
+
+def enqueue_upsert_job(encounter, encounter_id, hospital_id):
+    """
+    Persists the validated payload as a job hash and pushes its id onto the
+    shared Redis queue. Returns None when the queue is full.
+    """
+    if redis_client.llen(UPSERT_QUEUE_KEY) >= UPSERT_QUEUE_MAX:
+        return None
+
+    job_id = uuid.uuid4().hex
+    now = datetime.utcnow().isoformat()
+
+    pipe = redis_client.pipeline()
+    pipe.hset(_job_key(job_id), mapping={
+        "job_id": job_id,
+        "state": "queued",
+        "encounter_id": encounter_id,
+        "hospital_id": hospital_id,
+        "payload": json.dumps(encounter),
+        "created_at": now,
+        "updated_at": now
     })
+    # Older jobs for the same encounter are skipped once this one exists
+    pipe.set(_latest_job_key(encounter_id), job_id, ex=UPSERT_JOB_TTL)
+    pipe.lpush(UPSERT_QUEUE_KEY, job_id)
+    pipe.execute()
+
+    ensure_upsert_workers()
+    return job_id
+
+def _update_job(job_id, **fields):
+    fields["updated_at"] = datetime.utcnow().isoformat()
+    redis_client.hset(_job_key(job_id), mapping=fields)
+
+def _lock_encounter(encounter_id, job_id):
+    # The job itself may still hold the lock from before its worker died
+    lock_key = _encounter_lock_key(encounter_id)
+    if redis_client.set(lock_key, job_id, nx=True, ex=UPSERT_LOCK_TTL):
+        return True
+    return redis_client.get(lock_key) == job_id
+
+def _run_upsert_job(job_id):
+    """
+    Runs one job with its encounter locked, so jobs for the same encounter
+    never run concurrently. Returns False when another worker holds the
+    encounter (the caller requeues the job). A job that is no longer the
+    newest for its encounter is marked superseded instead of run.
+    """
+    job = redis_client.hgetall(_job_key(job_id))
+    if not job:
+        return True
 
-@app.route("/search-advanced", methods=["POST"])
-def search():
-    d = request.json
-    query_text = d.get("query", "")
+    encounter_id = job["encounter_id"]
+    if not _lock_encounter(encounter_id, job_id):
+        return False
 
-    # 1️⃣ Call CyborgDB REST API (AUTO-EMBED)
-    resp = requests.post(
-        f"{CYBORGDB_URL}/v1/vectors/query",
-        headers={
-            "Content-Type": "application/json",
-            "X-API-Key": CYBORG_API_KEY
-        },
-        json={
-            "index_name": INDEX_NAME,
-            "index_key": INDEX_KEY_BYTES.hex(),
-            "query_contents": query_text,  
-            "top_k": 10,
-            "include": ["distance", "metadata"]
-        },
-        timeout=120
-    )
+    try:
+        attempts = redis_client.hincrby(_job_key(job_id), "attempts", 1)
+
+        if redis_client.get(_latest_job_key(encounter_id)) not in (None, job_id):
+            _update_job(job_id, state="superseded")
+            redis_client.hdel(_job_key(job_id), "payload")
+        elif attempts > UPSERT_JOB_MAX_ATTEMPTS:
+            _update_job(job_id, state="failed", error=f"worker stopped during {attempts - 1} attempts")
+        else:
+            _update_job(job_id, state="running")
+            try:
+                result = process_encounter(
+                    json.loads(job["payload"]),
+                    encounter_id,
+                    job["hospital_id"]
+                )
+            except Exception as e:
+                logger.error("Upsert job %s failed: %s", job_id, e)
+                _update_job(job_id, state="failed", error=str(e))
+            else:
+                _update_job(job_id, state="succeeded", skipped=",".join(result["skipped"]))
+                # The raw payload is only needed until the job has run
+                redis_client.hdel(_job_key(job_id), "payload")
+
+        redis_client.expire(_job_key(job_id), UPSERT_JOB_TTL)
+    finally:
+        _release_upsert_lock(keys=[_encounter_lock_key(encounter_id)], args=[job_id])
+
+    return True
+
+def _upsert_worker_loop(processing_key):
+    while True:
+        try:
+            job_id = redis_client.blmove(UPSERT_QUEUE_KEY, processing_key, 5, "RIGHT", "LEFT")
+            if job_id is None:
+                continue
+
+            if _run_upsert_job(job_id):
+                redis_client.lrem(processing_key, 1, job_id)
+                continue
+
+            # Encounter busy in another worker: back of the queue
+            pipe = redis_client.pipeline()
+            pipe.lpush(UPSERT_QUEUE_KEY, job_id)
+            pipe.lrem(processing_key, 1, job_id)
+            pipe.execute()
+            time.sleep(0.1)
+        except Exception as e:
+            logger.error("Upsert worker error: %s", e)
+            time.sleep(1)
+
+def reclaim_upsert_jobs():
+    """
+    Pushes jobs left on the processing lists of processes that stopped
+    heartbeating back to the front of the queue. Returns how many.
+    """
+    requeued = 0
+    for list_key, process_id in redis_client.hgetall(UPSERT_LISTS_KEY).items():
+        if redis_client.exists(_alive_key(process_id)):
+            continue
+
+        while True:
+            job_id = redis_client.lmove(list_key, UPSERT_QUEUE_KEY, "RIGHT", "RIGHT")
+            if job_id is None:
+                break
+            if redis_client.exists(_job_key(job_id)):
+                _update_job(job_id, state="queued")
+            requeued += 1
+        redis_client.hdel(UPSERT_LISTS_KEY, list_key)
+
+    if requeued:
+        logger.warning(f"♻️ Requeued {requeued} upsert jobs from stopped workers")
+    return requeued
+
+def _upsert_heartbeat(process_id, processing_keys):
+    pipe = redis_client.pipeline()
+    pipe.set(_alive_key(process_id), "1", ex=UPSERT_HEARTBEAT_TTL)
+    pipe.hset(UPSERT_LISTS_KEY, mapping={key: process_id for key in processing_keys})
+    pipe.execute()
+    reclaim_upsert_jobs()
+
+def _upsert_heartbeat_loop(process_id, processing_keys):
+    while True:
+        time.sleep(UPSERT_HEARTBEAT_TTL / 3)
+        try:
+            _upsert_heartbeat(process_id, processing_keys)
+        except Exception as e:
+            logger.error("Upsert heartbeat error: %s", e)
+
+def ensure_upsert_workers():
+    """
+    Starts the worker threads once per process. Called lazily (not at import)
+    so forked server workers each get their own live pool. Jobs stranded by
+    stopped processes are reclaimed first, then on every heartbeat.
+    """
+    if _upsert_workers or UPSERT_WORKERS <= 0:
+        return
+
+    with _upsert_workers_lock:
+        if _upsert_workers:
+            return
+
+        # Hostname and pid repeat across container restarts; the random part
+        # keeps a restarted process from inheriting (and never reclaiming)
+        # the processing lists of the one that crashed
+        process_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        processing_keys = [_processing_key(process_id, i) for i in range(UPSERT_WORKERS)]
+        try:
+            _upsert_heartbeat(process_id, processing_keys)
+        except Exception as e:
+            logger.error("Upsert heartbeat error: %s", e)
+
+        threading.Thread(
+            target=_upsert_heartbeat_loop,
+            args=(process_id, processing_keys),
+            name="upsert-heartbeat",
+            daemon=True
+        ).start()
+
+        for i, processing_key in enumerate(processing_keys):
+            worker = threading.Thread(
+                target=_upsert_worker_loop,
+                args=(processing_key,),
+                name=f"upsert-worker-{i}",
+                daemon=True
+            )
+            worker.start()
+            _upsert_workers.append(worker)
+
+        logger.info(f"🧵 Started {UPSERT_WORKERS} upsert workers")
+
+def wants_async_upsert():
+    if request.args.get("mode") == "async":
+        return True
+    return "respond-async" in request.headers.get("Prefer", "")
+
+# =========================
+# RETRIEVAL
+# =========================
+class VectorSearchError(RuntimeError):
+    pass
+
+def query_payload(query_text, top_k):
+    # Repeated query strings hit the embedding cache instead of the server's embedder
+    payload = {"top_k": top_k, "include": ["distance", "metadata"]}
+    vector = embed_texts([query_text])[0]
+
+    if vector is not None:
+        payload["query_vectors"] = vector
+    else:
+        payload["query_contents"] = query_text
+
+    return payload
+
+def _query_vectors(query_text, top_k, filters=None, index_name=INDEX_NAME, deadline=None):
+    payload = query_payload(query_text, top_k)
+    if filters:
+        payload["filters"] = filters
+
+    try:
+        resp = cyborgdb_query(payload, index_name=index_name, deadline=deadline)
+    except requests.exceptions.RequestException as e:
+        raise VectorSearchError(str(e))
 
     if not resp.ok:
-        return jsonify({
-            "error": "Vector search failed",
-            "details": resp.text
-        }), 500
+        raise VectorSearchError(resp.text)
 
-    results = resp.json().get("results", [])
-    print(f"🔎 Search returned {results}")
-    matches = []
+    return resp.json().get("results", [])
+
+def _scope_candidates(results, hospital_id=None, decrypted=None):
+    """
+    Decrypts result metadata and keeps the ones in scope, in rank order.
+    For local scope, the plaintext hospital_tag lets off-scope results be
+    dropped before paying for a decrypt. `decrypted` memoizes across pages.
+    """
+    expected_tag = hospital_tag(hospital_id) if hospital_id is not None else None
+    decrypted = {} if decrypted is None else decrypted
+    candidates = []
 
     for r in results:
-        meta_enc = r.get("metadata", {}).get("secure_blob")
+        metadata = r.get("metadata") or {}
+        meta_enc = metadata.get("secure_blob")
         if not meta_enc:
             continue
 
-        # 2️⃣ Decrypt metadata
-        meta = decrypt_metadata(meta_enc)
+        tag = metadata.get("hospital_tag")
+        if expected_tag and tag is not None and tag != expected_tag:
+            continue
+
+        if r["id"] not in decrypted:
+            with metrics.timed("decrypt"):
+                decrypted[r["id"]] = decrypt_metadata(meta_enc)
+        meta = decrypted[r["id"]]
 
-        # 3️⃣ Scope filtering
-        if d.get("scope") == "local":
-            if meta.get("hospital_id") != d.get("hospital_id"):
-                continue
+        if hospital_id is not None and meta.get("hospital_id") != hospital_id:
+            continue
 
         eid = r["id"].replace("encounter:", "")
+        candidates.append((eid, meta, r))
 
-        # 4️⃣ Fetch hydrated encounter from Redis
-        enc_data = redis_client.get(f"encounter:{eid}")
-        if not enc_data:
-            continue
+    return candidates
+
+def _timed_query(query_text, top_k, filters, index_name, deadline=None):
+    # A shard query that sat in shard_pool's queue past the budget never starts
+    if deadline is not None and deadline.expired:
+        return [], {"index": index_name, "latency_ms": 0.0, "results": 0, "error": "request deadline exceeded"}
+
+    started = time.perf_counter()
+    error = None
+    try:
+        with metrics.timed("vector_query"):
+            results = _query_vectors(query_text, top_k, filters, index_name, deadline)
+    except VectorSearchError as e:
+        results, error = [], str(e)
+
+    stat = {
+        "index": index_name,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+        "results": len(results)
+    }
+    if error:
+        stat["error"] = error
+    return results, stat
+
+def _fan_out_query(query_text, top_k, deadline=None):
+    """
+    Queries every shard concurrently and merges by distance into one top_k.
+    Fails only when every shard failed.
+    """
+    index_names = all_index_names()
+
+    if len(index_names) == 1:
+        outcomes = [_timed_query(query_text, top_k, None, index_names[0], deadline)]
+    else:
+        futures = [
+            shard_pool.submit(_timed_query, query_text, top_k, None, index_name, deadline)
+            for index_name in index_names
+        ]
+        outcomes = [future.result() for future in futures]
+
+    merged, stats = [], []
+    for results, stat in outcomes:
+        merged.extend(results)
+        stats.append(stat)
+
+    if all("error" in stat for stat in stats):
+        raise VectorSearchError("; ".join(stat["error"] for stat in stats))
+
+    merged.sort(key=lambda r: float(r.get("distance", 0)))
+    return merged[:top_k], stats
+
+def _merge_candidates(*groups):
+    # Union by encounter id, closest first
+    merged = {}
+    for group in groups:
+        for candidate in group:
+            merged.setdefault(candidate[0], candidate)
+    return sorted(merged.values(), key=lambda c: float(c[2].get("distance", 0)))
+
+def _overfetch_local(query_text, hospital_id, index_name, stats, deadline=None, found=()):
+    # Page with a growing top_k until enough local hits (or the index runs
+    # dry, or the request budget does: then the hits so far are the answer).
+    # `found` (the tag-filtered hits) is merged in, never replaced.
+    top_k = SEARCH_TOP_K
+    decrypted = {}
+
+    while True:
+        results, stat = _timed_query(query_text, top_k, None, index_name, deadline)
+        stats.append(stat)
+        if "error" in stat:
+            raise VectorSearchError(stat["error"])
+
+        candidates = _merge_candidates(found, _scope_candidates(results, hospital_id, decrypted))
+
+        if (
+            len(candidates) >= SEARCH_RESULT_LIMIT
+            or len(results) < top_k
+            or top_k >= LOCAL_SEARCH_MAX_TOP_K
+            or (deadline is not None and deadline.expired)
+        ):
+            return candidates
+
+        top_k = min(top_k * 2, LOCAL_SEARCH_MAX_TOP_K)
+
+def retrieve_candidates(query_text, scope, hospital_id, deadline=None):
+    """
+    Returns ([(encounter_id, decrypted_meta, raw_result)], shard_stats), with
+    candidates in rank order. Global scope fans out over every shard; local
+    scope only touches the hospital's shard and asks the vector layer for the
+    hospital's own vectors via the hospital_tag filter. A short filtered set
+    is complete; only with LOCAL_SEARCH_LEGACY_OVERFETCH are vectors written
+    before tagging existed looked for by adaptive over-fetch, merged in.
+    """
+    if scope != "local":
+        results, stats = _fan_out_query(query_text, SEARCH_TOP_K, deadline)
+        return _scope_candidates(results), stats
+
+    index_name = index_for_hospital(hospital_id)
+    stats = []
+
+    if LOCAL_SEARCH_MODE == "filter":
+        results, stat = _timed_query(
+            query_text,
+            SEARCH_TOP_K,
+            {"hospital_tag": {"$eq": hospital_tag(hospital_id)}},
+            index_name,
+            deadline
+        )
+        stats.append(stat)
+        if "error" in stat:
+            raise VectorSearchError(stat["error"])
+
+        candidates = _scope_candidates(results, hospital_id)
+        if (
+            not LOCAL_SEARCH_LEGACY_OVERFETCH
+            or len(candidates) >= SEARCH_RESULT_LIMIT
+            or (deadline is not None and deadline.expired)
+        ):
+            return candidates, stats
+
+        return _overfetch_local(query_text, hospital_id, index_name, stats, deadline, candidates), stats
+
+    return _overfetch_local(query_text, hospital_id, index_name, stats, deadline), stats
+
+def vector_deadline(deadline):
+    # Retrieval's share of the request budget, leaving room for the fallback
+    # (and synthesis) when CyborgDB hangs; without a fallback it gets it all
+    if not lexical_fallback_available():
+        return deadline
+    if SEARCH_VECTOR_TIMEOUT_MS > 0:
+        return Deadline(min(deadline.remaining(), SEARCH_VECTOR_TIMEOUT_MS / 1000))
+    return Deadline(deadline.remaining() * SEARCH_VECTOR_BUDGET_FRACTION)
+
+def lexical_candidates(query_text, scope, hospital_id):
+    """
+    BM25 stand-in for retrieve_candidates, in the same candidate shape.
+    "distance" is 1 / (1 + bm25), so lower still means closer.
+    """
+    started = time.perf_counter()
+    with metrics.timed("lexical_query"):
+        hits = lexical_index.search(
+            query_text, SEARCH_TOP_K, hospital_id if scope == "local" else None
+        )
+
+    candidates = [
+        (
+            eid,
+            {"hospital_id": hid, "encounter_id": eid},
+            {"id": f"encounter:{eid}", "distance": 1 / (1 + score), "bm25": round(score, 4)}
+        )
+        for eid, hid, score in hits
+    ]
+    stat = {
+        "index": "lexical",
+        "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+        "results": len(candidates)
+    }
+    return candidates, stat
+
+def lexical_rerank_order(query_text, ranked):
+    """
+    Takes [(encounter_id, distance)] in vector order and returns their
+    positions re-ordered by a blend of vector similarity and BM25
+    (normalized to the best candidate). Distances are left as returned.
+    """
+    scores = lexical_index.scores(query_text, [eid for eid, _ in ranked])
+    best = max(scores.values(), default=0.0)
+    if not best:
+        return list(range(len(ranked)))
+
+    def blended(i):
+        eid, distance = ranked[i]
+        similarity = 1 - float(distance or 0)
+        return (1 - LEXICAL_RERANK_WEIGHT) * similarity + LEXICAL_RERANK_WEIGHT * scores[eid] / best
+
+    return sorted(range(len(ranked)), key=blended, reverse=True)
+
+def lexical_rerank_enabled():
+    return LEXICAL_RERANK_WEIGHT > 0 and lexical_fallback_available()
+
+def lexical_fallback_available():
+    return LEXICAL_INDEX and len(lexical_index) > 0
+
+def search_candidates(query_text, scope, hospital_id, deadline):
+    """
+    Returns (candidates, shard_stats, retrieval). When the vector query fails
+    or misses its deadline, the lexical index answers instead and retrieval
+    is "lexical"; VectorSearchError only escapes when there is no fallback.
+    """
+    try:
+        candidates, stats = retrieve_candidates(query_text, scope, hospital_id, vector_deadline(deadline))
+    except VectorSearchError as e:
+        if not lexical_fallback_available():
+            raise
+        logger.warning("⚠️ Vector search failed, answering from the lexical index: %s", e)
+        candidates, stat = lexical_candidates(query_text, scope, hospital_id)
+        return candidates, [{**stat, "vector_error": str(e)}], "lexical"
+
+    if lexical_rerank_enabled():
+        with metrics.timed("lexical_rerank"):
+            order = lexical_rerank_order(query_text, [(eid, r.get("distance")) for eid, _, r in candidates])
+            candidates = [candidates[i] for i in order]
+
+    return candidates, stats, "vector"
+
+def build_match(eid, meta, r, encounter):
+    return {
+        "encounter_id": eid,
+        "hospital_id": meta.get("hospital_id"),
+        "encounter": encounter,
+        "score": float(r.get("distance", 0))
+    }
+
+def search_view(d):
+    """
+    Returns (expand, fields): cards by default, the full flattened encounter
+    with expand=true, or the card plus named extra fields.
+    """
+    fields = d.get("fields") or []
+    if isinstance(fields, str):
+        fields = [f for f in fields.split(",") if f]
+    return bool(d.get("expand")), tuple(sorted(str(f) for f in fields))
+
+def project_record(record, expand, fields):
+    flat = flatten_record(record)
+    if expand:
+        return flat
+    return {**build_search_card(record), **{f: flat.get(f) for f in fields}}
+
+def hydrate_matches(candidates, expand=False, fields=()):
+    # Fetch cards (or full records) from Redis in a single round trip
+    eids = [eid for eid, _, _ in candidates]
+
+    with metrics.timed("redis_hydrate"):
+        if expand or fields:
+            encounters = [
+                project_record(record, expand, fields) if record else None
+                for record in load_records(eids)
+            ]
+        else:
+            encounters = load_cards(eids)
+
+    return [
+        build_match(eid, meta, r, encounter)
+        for (eid, meta, r), encounter in zip(candidates, encounters)
+        if encounter
+    ]
+
+def search_cache_entry(d):
+    """
+    Returns (cache_key, cached_response); both None when caching is off.
+    """
+    if not search_cache.enabled:
+        return None, None
+
+    cache_key = search_cache_key(d.get("query", ""), d.get("scope"), d.get("hospital_id"), search_view(d))
+    cached = search_cache.get(cache_key)
+    metrics.cache_lookup("search", hit=cached is not None)
+    return cache_key, cached
+
+def synthesize_within_budget(query_text, final, deadline):
+    """
+    Returns (synthesis, degraded). Synthesis is optional: it is skipped
+    outright when less than SYNTHESIS_MIN_BUDGET_MS is left, and a fallback
+    answer (timeout, open breaker, ...) also marks the response degraded.
+    """
+    if not final:
+        return {}, False
+
+    if deadline.remaining_ms() < SYNTHESIS_MIN_BUDGET_MS:
+        return dict(SYNTHESIS_FALLBACK), True
+
+    synthesis = synthesize_answer(query_text, final, deadline)
+    return synthesis, synthesis == SYNTHESIS_FALLBACK
+
+def vector_search_failed(error, deadline):
+    # (body, status); each app wraps the body in its own jsonify
+    if deadline.expired:
+        return {
+            "error": "Request deadline exceeded",
+            "details": str(error)
+        }, 504
+
+    return {
+        "error": "Vector search failed",
+        "details": str(error)
+    }, 500
+
+def store_search_result(cache_key, response):
+    # Never pin a degraded synthesis or a lexical fallback answer in the cache
+    if (
+        cache_key is not None
+        and response["synthesis"] != SYNTHESIS_FALLBACK
+        and response.get("retrieval") != "lexical"
+    ):
+        search_cache.set(cache_key, response)
+
+# =========================
+# ROUTES
+# =========================
+@app.before_request
+def _start_background_workers():
+    ensure_upsert_workers()
+    ensure_lexical_index()
+
+def _route_label():
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+@app.before_request
+def _track_request_start():
+    g.request_started = time.perf_counter()
+    metrics.in_flight.inc(name=_route_label())
+
+@app.after_request
+def _track_request_end(response):
+    route = _route_label()
+    metrics.requests_total.inc(route=route, status=response.status_code)
+    # Errors are counted once, in teardown: an unhandled exception also
+    # reaches here as a 500
+    g.response_status = response.status_code
+    metrics.request_seconds.observe(time.perf_counter() - g.request_started, route=route)
+    return response
+
+@app.teardown_request
+def _track_request_teardown(exc):
+    if "request_started" not in g:
+        return
+    metrics.in_flight.dec(name=_route_label())
+    if exc is not None or g.get("response_status", 0) >= 500:
+        metrics.errors_total.inc(route=_route_label())
+
+upsert_queue_depth = metrics.registry.gauge(
+    "medsec_upsert_queue_depth",
+    "Async upsert jobs waiting in the Redis queue"
+)
+
+@metrics.registry.collector
+def _collect_queue_depth():
+    upsert_queue_depth.set(redis_client.llen(UPSERT_QUEUE_KEY))
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/upsert-encounter", methods=["POST"])
+def upsert_encounter():
+    try:
+        encounter, encounter_id, hospital_id = prepare_encounter(request.json)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not wants_async_upsert():
+        deadline = request_deadline(request.headers, request.json)
+        try:
+            return jsonify(process_encounter(encounter, encounter_id, hospital_id, deadline))
+        except requests.exceptions.Timeout as e:
+            return jsonify({
+                "error": "Request deadline exceeded",
+                "details": str(e)
+            }), 504
+
+    job_id = enqueue_upsert_job(encounter, encounter_id, hospital_id)
+    if job_id is None:
+        return jsonify({"error": "upsert queue is full"}), 503, {"Retry-After": "5"}
 
-        enc_data = json.loads(enc_data)
+    return jsonify({
+        "status": "queued",
+        "job_id": job_id,
+        "encounter_id": encounter_id,
+        "status_url": f"/jobs/{job_id}"
+    }), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = redis_client.hgetall(_job_key(job_id))
+    if not job:
+        return jsonify({"error": "job not found"}), 404
+
+    job.pop("payload", None)
+    return jsonify(job)
+
+@app.route("/upsert-encounters", methods=["POST"])
+def upsert_encounters():
+    """
+    Bulk variant of /upsert-encounter for backfills.
+    Accepts {"encounters": [...]} (or a bare list) and reports a result per item,
+    so one bad record never aborts the rest of the batch.
+    """
+    body = request.json
+    encounters = body.get("encounters") if isinstance(body, dict) else body
+
+    if not isinstance(encounters, list) or not encounters:
+        return jsonify({"error": "encounters must be a non-empty list"}), 400
 
-        # 5️⃣ Flatten encounter: combine raw_encounter + summary for consistent format
-        raw = enc_data.get("raw_encounter", enc_data)  
-        summary = enc_data.get("summary", {})
-        flattened_encounter = {**raw, **summary}
+    if len(encounters) > BULK_MAX_ENCOUNTERS:
+        return jsonify({
+            "error": f"too many encounters (max {BULK_MAX_ENCOUNTERS})"
+        }), 413
+
+    results = [None] * len(encounters)
+    prepared = []
+
+    # 1. Validate
+    for i, raw in enumerate(encounters):
+        try:
+            encounter, encounter_id, hospital_id = prepare_encounter(raw)
+        except ValueError as e:
+            results[i] = {"index": i, "status": "error", "error": str(e)}
+            continue
+        prepared.append((i, encounter, encounter_id, hospital_id))
+
+    # 2. Reuse stored summaries whose clinical input is unchanged, and
+    #    normalize the rest in packed batches, several batches at a time
+    #    (each batch falls back to single calls, each call to its fallback)
+    encounter_ids = [p[2] for p in prepared]
+    fingerprints = load_fingerprints(encounter_ids)
+    normalize_fps = [normalization_fingerprint(p[1]) for p in prepared]
+    normalized_all = reusable_summaries(encounter_ids, fingerprints, normalize_fps)
+    skipped_all = [["normalize"] if n is not None else [] for n in normalized_all]
+
+    to_normalize = [k for k, n in enumerate(normalized_all) if n is None]
+    batches = [
+        [to_normalize[j] for j in batch]
+        for batch in pack_normalization_batches([prepared[k][1] for k in to_normalize])
+    ]
+    with ThreadPoolExecutor(max_workers=max(1, BULK_NORMALIZE_CONCURRENCY)) as pool:
+        outcomes = pool.map(
+            lambda batch: normalize_encounters_batch([prepared[k][1] for k in batch]),
+            batches
+        )
+        for batch, batch_outcomes in zip(batches, outcomes):
+            for k, (normalized, from_llm) in zip(batch, batch_outcomes):
+                normalized_all[k] = normalized
+                if not from_llm:
+                    normalize_fps[k] = None
+
+    # 3. Store structured summaries through one pipeline
+    pipe = record_redis.pipeline(transaction=False)
+    for (i, encounter, encounter_id, hospital_id), normalized in zip(prepared, normalized_all):
+        save_record(encounter_id, {
+            "raw_encounter": encounter,
+            "summary": normalized
+        }, pipe=pipe)
 
-        matches.append({
-            "encounter_id": eid,
-            "hospital_id": meta.get("hospital_id"),
-            "encounter": flattened_encounter,
-            "score": float(r.get("distance", 0))
-        })
+    try:
+        with metrics.timed("redis_write"):
+            replies = pipe.execute(raise_on_error=False)
+    except Exception as e:
+        logger.error("Bulk Redis write failed: %s", e)
+        replies = [e] * (len(prepared) * RECORD_WRITES)
+
+    # One reply per queued command; an item failed if any of its writes did
+    item_replies = [
+        next((r for r in replies[k:k + RECORD_WRITES] if isinstance(r, Exception)), None)
+        for k in range(0, len(replies), RECORD_WRITES)
+    ]
+
+    pending = []
+    fingerprint_entries = {}
+    for k, (p, normalized, reply) in enumerate(zip(prepared, normalized_all, item_replies)):
+        i, encounter, encounter_id, hospital_id = p
+        if isinstance(reply, Exception):
+            results[i] = {
+                "index": i,
+                "encounter_id": encounter_id,
+                "status": "error",
+                "error": f"redis: {reply}"
+            }
+            continue
 
-    # 6️⃣ Take top 5 matches
-    final = matches[:5]
+        semantic_text = build_semantic_text(normalized)
+        vector_fp = vector_fingerprint(hospital_id, semantic_text)
+        fingerprint_entries[i] = (encounter_id, normalize_fps[k], vector_fp)
+
+        if fingerprints[k].get("vector") == vector_fp:
+            skipped_all[k].append("vector_upsert")
+            results[i] = {
+                "index": i,
+                "encounter_id": encounter_id,
+                "status": "stored",
+                "skipped": skipped_all[k]
+            }
+            continue
 
-    # 7️⃣ Generate synthesis using the flattened encounters
-    synthesis = synthesize_answer(query_text, final) if final else {}
+        pending.append((i, encounter_id, hospital_id, semantic_text, skipped_all[k]))
+
+    # One embedding batch for everything that still needs a vector
+    vectors = embed_texts([text for _, _, _, text, _ in pending])
+    lexical_entries = {i: (encounter_id, hospital_id, text) for i, encounter_id, hospital_id, text, _ in pending}
+    pending = [
+        (i, encounter_id, (hospital_id, build_vector_item(encounter_id, hospital_id, text, vector)), skipped)
+        for (i, encounter_id, hospital_id, text, skipped), vector in zip(pending, vectors)
+    ]
+
+    # 4. Upsert into CyborgDB in large chunks (routed per shard)
+    for chunk in chunked(pending, max(1, BULK_UPSERT_CHUNK_SIZE)):
+        try:
+            upsert_vectors([routed for _, _, routed, _ in chunk])
+            status, error = "stored", None
+        except Exception as e:
+            logger.error("Bulk CyborgDB upsert failed: %s", e)
+            status, error = "error", f"cyborgdb: {e}"
+
+        for i, encounter_id, _, skipped in chunk:
+            results[i] = {"index": i, "encounter_id": encounter_id, "status": status}
+            if error:
+                results[i]["error"] = error
+            else:
+                results[i]["skipped"] = skipped
+
+    stored = [i for i, _, _, _ in prepared if results[i]["status"] == "stored"]
+    store_fingerprints([fingerprint_entries[i] for i in stored])
+    index_lexical([lexical_entries[i] for i in stored if i in lexical_entries])
+
+    changed_hospitals = [
+        hospital_id for i, _, _, hospital_id in prepared
+        if results[i]["status"] == "stored" and len(results[i]["skipped"]) < 2
+    ]
+    if changed_hospitals:
+        invalidate_search_cache(changed_hospitals)
+
+    failed = sum(1 for r in results if r["status"] != "stored")
 
     return jsonify({
+        "stored": len(results) - failed,
+        "failed": failed,
+        "results": results
+    }), (207 if failed else 200)
+
+@app.route("/search-advanced", methods=["POST"])
+def search():
+    d = request.json
+    query_text = d.get("query", "")
+    deadline = request_deadline(request.headers, d)
+
+    # 0️⃣ Serve repeated searches from the result cache
+    cache_key, cached = search_cache_entry(d)
+    if cached is not None:
+        return jsonify({**cached, "cached": True, "degraded": False})
+
+    # 1️⃣ Query CyborgDB (AUTO-EMBED), 2️⃣ decrypt metadata, 3️⃣ scope to hospital
+    #    (or the lexical index, if the vector query fails or runs out of time)
+    try:
+        candidates, shard_stats, retrieval = search_candidates(
+            query_text, d.get("scope"), d.get("hospital_id"), deadline
+        )
+    except VectorSearchError as e:
+        body, status = vector_search_failed(e, deadline)
+        return jsonify(body), status
+
+    # 4️⃣ + 5️⃣ Hydrate search cards (or full encounters) from Redis
+    matches = hydrate_matches(candidates, *search_view(d))
+
+    # 6️⃣ Take top matches
+    final = matches[:SEARCH_RESULT_LIMIT]
+
+    # 7️⃣ Generate synthesis from the matched cards, if the budget allows
+    synthesis, degraded = synthesize_within_budget(query_text, final, deadline)
+
+    response = {
         "matches": final,
-        "synthesis": synthesis
+        "synthesis": synthesis,
+        "retrieval": retrieval
+    }
+    store_search_result(cache_key, response)
+
+    return jsonify({
+        **response,
+        "cached": False,
+        "degraded": degraded or retrieval == "lexical",
+        "shards": shard_stats
+    })
+
+@app.route("/search-advanced/stream", methods=["POST"])
+def search_stream():
+    """
+    NDJSON variant of /search-advanced: a "matches" event is flushed as soon
+    as hydration completes, and a "synthesis" event follows once Gemini answers.
+    """
+    d = request.json
+    query_text = d.get("query", "")
+    deadline = request_deadline(request.headers, d)
+
+    def ndjson(event, **fields):
+        return json.dumps({"event": event, **fields}) + "\n"
+
+    def stream(events):
+        return Response(
+            stream_with_context(events()),
+            mimetype="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    cache_key, cached = search_cache_entry(d)
+    if cached is not None:
+        def cached_events():
+            # Same event shapes as the uncached stream (only vector answers are cached)
+            retrieval = cached.get("retrieval", "vector")
+            yield ndjson("matches", matches=cached["matches"], cached=True, retrieval=retrieval, shards=[])
+            yield ndjson("synthesis", synthesis=cached["synthesis"], degraded=False)
+        return stream(cached_events)
+
+    # Retrieval runs before the response starts so failures keep a 500/504 status
+    try:
+        candidates, shard_stats, retrieval = search_candidates(
+            query_text, d.get("scope"), d.get("hospital_id"), deadline
+        )
+    except VectorSearchError as e:
+        body, status = vector_search_failed(e, deadline)
+        return jsonify(body), status
+
+    final = hydrate_matches(candidates, *search_view(d))[:SEARCH_RESULT_LIMIT]
+
+    def events():
+        yield ndjson("matches", matches=final, cached=False, retrieval=retrieval, shards=shard_stats)
+
+        synthesis, degraded = synthesize_within_budget(query_text, final, deadline)
+        yield ndjson("synthesis", synthesis=synthesis, degraded=degraded or retrieval == "lexical")
+
+        store_search_result(cache_key, {"matches": final, "synthesis": synthesis, "retrieval": retrieval})
+
+    return stream(events)
+
+@app.route("/encounters/<encounter_id>", methods=["GET"])
+def get_encounter(encounter_id):
+    """
+    Full encounter for callers that drill into a search card. Only the
+    owning hospital may read it.
+    """
+    record = load_records([encounter_id])[0]
+    if record is None:
+        return jsonify({"error": "encounter not found"}), 404
+
+    encounter = flatten_record(record)
+    if str(encounter.get("hospital")) != request.args.get("hospital_id"):
+        return jsonify({"error": "encounter belongs to another hospital"}), 403
+
+    return jsonify({
+        "encounter_id": encounter_id,
+        "encounter": encounter
     })
 
+@app.route("/health", methods=["GET"])
+def health():
+    return jsonify({
+        "status": "ok",
+        "index_name": INDEX_NAME,
+        "active_index": active_index_base(),
+        "reindex_target": reindex_target_base(),
+        "cyborgdb_transport": cyborg_http.stats(),
+        "llm_governor": llm_governor.stats(),
+        "embedder": embedder.stats() if embedder else None,
+        "lexical_index": lexical_stats(),
+        "llm_cache": llm_cache_stats()
+    })
+
+# Opt-in: seeding never runs on import unless SEED_ON_STARTUP is set.
+# A freshly created index has no vectors, so stored hashes are ignored.
+if SEED_ON_STARTUP:
+    seed_database(force=index_created)
+
 if __name__ == "__main__":
-    app.run(port=7000)
\ No newline at end of file
+    if sys.argv[1:2] == ["seed"]:
+        seed_database(force="--force" in sys.argv)
+    else:
+        app.run(port=7000)
\ No newline at end of file
@@ -0,0 +1,704 @@
+"""
+MedSec – asyncio service mode
+ASGI (Quart) version of /search-advanced and /upsert-encounter.
+
+Run with:  uvicorn async_app:app --port 7000
+
+Config, prompts, crypto and record helpers come from app.py; every network
+call here goes through an async client (httpx, redis.asyncio, Gemini aio),
+so one process can keep hundreds of searches in flight.
+"""
+
+import asyncio
+import os
+import time
+
+import httpx
+import redis
+import redis.asyncio as aioredis
+from quart import Quart, Response, g, request, jsonify
+from quart_cors import cors
+
+import app as core
+import metrics
+import record_codec
+from cyborgdb_transport import AsyncCyborgDBTransport
+
+logger = core.logger
+
+# =========================
+# CONFIG
+# =========================
+ASYNC_CYBORGDB_POOL_SIZE = int(os.getenv("ASYNC_CYBORGDB_POOL_SIZE", "100"))
+ASYNC_REDIS_POOL_SIZE = int(os.getenv("ASYNC_REDIS_POOL_SIZE", "100"))
+
+# =========================
+# CLIENTS
+# =========================
+aredis = aioredis.from_url(
+    core.REDIS_URL,
+    decode_responses=True,
+    max_connections=ASYNC_REDIS_POOL_SIZE
+)
+cyborg_http = AsyncCyborgDBTransport(
+    core.CYBORGDB_URL,
+    core.CYBORG_API_KEY,
+    pool_size=ASYNC_CYBORGDB_POOL_SIZE,
+    connect_timeout=core.CYBORGDB_CONNECT_TIMEOUT,
+    read_timeout=core.CYBORGDB_READ_TIMEOUT,
+    max_retries=core.CYBORGDB_MAX_RETRIES,
+    backoff_base=core.CYBORGDB_RETRY_BACKOFF
+)
+aredis_records = aioredis.from_url(
+    core.REDIS_URL,
+    max_connections=ASYNC_REDIS_POOL_SIZE
+)
+migrate_record = aredis_records.register_script(record_codec.MIGRATE_SCRIPT)
+genai_aio = core.genai_client.aio
+
+# =========================
+# APP
+# =========================
+app = cors(Quart(__name__))
+
+@app.before_serving
+async def _startup():
+    # Jobs queued via ?mode=async are drained by app.py's worker threads
+    await asyncio.to_thread(core.ensure_upsert_workers)
+    await asyncio.to_thread(core.ensure_lexical_index)
+
+@app.after_serving
+async def _shutdown():
+    await cyborg_http.close()
+    await aredis.aclose()
+    await aredis_records.aclose()
+
+# =========================
+# INDEX ALIAS
+# =========================
+async def refresh_index_alias():
+    """
+    Async twin of app.refresh_index_alias. Fills the same per-process cache,
+    so core helpers given an explicit base never touch sync Redis on the loop.
+    """
+    alias = core._index_alias
+    if time.monotonic() - alias["checked_at"] < core.INDEX_ALIAS_TTL:
+        return alias
+
+    try:
+        async with aredis.pipeline(transaction=False) as pipe:
+            pipe.get(core.INDEX_ALIAS_KEY)
+            pipe.hmget(core.REINDEX_KEY, "state", "target")
+            active, (state, target) = await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Index alias refresh failed: %s", e)
+    else:
+        alias["active"] = active or core.INDEX_NAME
+        alias["target"] = target if state in ("building", "switched") else None
+    alias["checked_at"] = time.monotonic()
+    return alias
+
+async def active_index_base():
+    return (await refresh_index_alias())["active"]
+
+async def reindex_target_base():
+    alias = await refresh_index_alias()
+    return alias["target"] if alias["target"] != alias["active"] else None
+
+# =========================
+# CYBORGDB REST
+# =========================
+async def cyborgdb_upsert(items, index_name=core.INDEX_NAME, deadline=None):
+    with metrics.timed("vector_upsert"):
+        resp = await cyborg_http.post("/v1/vectors/upsert", {
+            "index_name": index_name,
+            "index_key": core.INDEX_KEY_BYTES.hex(),
+            "items": items
+        }, idempotent=True, deadline=core._deadline_at(deadline))
+
+    if resp.status_code != 200:
+        raise RuntimeError(resp.text)
+
+    return resp.json()
+
+async def upsert_vectors(routed_items, deadline=None):
+    base = await active_index_base()
+    await asyncio.gather(*(
+        cyborgdb_upsert(items, index_name=index_name, deadline=deadline)
+        for index_name, items in core.route_items(routed_items, base).items()
+    ))
+    # Dual-write to a reindex target, if one is building (rare; off the loop)
+    if await reindex_target_base() is not None:
+        await asyncio.to_thread(core.mirror_to_reindex, routed_items)
+
+async def query_vectors(query_text, top_k, filters=None, index_name=core.INDEX_NAME, deadline=None):
+    payload = {
+        "index_name": index_name,
+        "index_key": core.INDEX_KEY_BYTES.hex(),
+        # Local embedding (cache lookups, model inference) stays off the event loop
+        **(await asyncio.to_thread(core.query_payload, query_text, top_k))
+    }
+    if filters:
+        payload["filters"] = filters
+
+    try:
+        resp = await cyborg_http.post(
+            "/v1/vectors/query", payload, idempotent=True, deadline=core._deadline_at(deadline)
+        )
+    except Exception as e:
+        raise core.VectorSearchError(str(e))
+
+    if resp.status_code >= 400:
+        raise core.VectorSearchError(resp.text)
+
+    return resp.json().get("results", [])
+
+async def timed_query(query_text, top_k, filters, index_name, deadline=None):
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    error = None
+    try:
+        with metrics.timed("vector_query"):
+            results = await query_vectors(query_text, top_k, filters, index_name, deadline)
+    except core.VectorSearchError as e:
+        results, error = [], str(e)
+
+    stat = {
+        "index": index_name,
+        "latency_ms": round((loop.time() - started) * 1000, 2),
+        "results": len(results)
+    }
+    if error:
+        stat["error"] = error
+    return results, stat
+
+# =========================
+# LLM
+# =========================
+async def _llm_cache_count(purpose, outcome):
+    try:
+        await aredis.hincrby(core.LLM_CACHE_STATS_KEY, f"{purpose}:{outcome}", 1)
+    except redis.RedisError:
+        pass
+
+async def llm_generate(prompt, parse, purpose, model=core.GEMINI_MODEL, deadline=None):
+    """
+    Async twin of app.llm_generate, sharing its Redis cache keys and counters;
+    as there, a Redis failure only turns into a cache miss.
+    """
+    key = core._llm_cache_key(model, prompt)
+
+    if core.LLM_CACHE_TTL > 0:
+        try:
+            cached = await aredis.get(key)
+        except redis.RedisError as e:
+            logger.warning("LLM cache read failed: %s", e)
+            cached = None
+
+        if cached is not None:
+            try:
+                result = parse(cached)
+            except Exception:
+                try:
+                    await aredis.delete(key)
+                except redis.RedisError as e:
+                    logger.warning("LLM cache delete failed: %s", e)
+            else:
+                await _llm_cache_count(purpose, "hits")
+                metrics.cache_lookup("llm", hit=True)
+                return result
+
+        await _llm_cache_count(purpose, "misses")
+        metrics.cache_lookup("llm", hit=False)
+
+    timeout = core.LLM_DEADLINES.get(purpose)
+    if deadline is not None:
+        if deadline.expired:
+            raise core.LLMUnavailable("request deadline exceeded")
+        timeout = deadline.cap(timeout)
+
+    # Running out of the caller's budget says nothing about Gemini's health
+    own_deadline = timeout == core.LLM_DEADLINES.get(purpose)
+
+    metrics.in_flight.inc(name=f"llm_{purpose}")
+    try:
+        with metrics.timed(f"llm_{purpose}"):
+            res = await core.llm_governor.acall(
+                lambda: genai_aio.models.generate_content(model=model, contents=prompt),
+                timeout=timeout,
+                trip_on_timeout=own_deadline
+            )
+    finally:
+        metrics.in_flight.dec(name=f"llm_{purpose}")
+    text = res.text
+    result = parse(text)
+
+    if core.LLM_CACHE_TTL > 0:
+        try:
+            await aredis.set(key, text, ex=core.LLM_CACHE_TTL)
+        except redis.RedisError as e:
+            logger.warning("LLM cache write failed: %s", e)
+
+    return result
+
+async def synthesize_answer(query, encounters, deadline=None):
+    try:
+        return await llm_generate(
+            core.build_synthesis_prompt(query, encounters),
+            core.parse_synthesis,
+            purpose="synthesize",
+            deadline=deadline
+        )
+    except Exception as e:
+        logger.error(e)
+        return dict(core.SYNTHESIS_FALLBACK)
+
+async def normalize_encounter(encounter, deadline=None):
+    # (normalized, from_llm), as app.normalize_encounter_with_gemini
+    try:
+        return await llm_generate(
+            core.build_normalization_prompt(encounter),
+            core.parse_normalized,
+            purpose="normalize",
+            deadline=deadline
+        ), True
+    except Exception as e:
+        logger.error("Gemini normalization failed: %s", e)
+        return core.normalization_fallback(encounter), False
+
+# =========================
+# CHANGE DETECTION
+# =========================
+async def load_fingerprints(encounter_id):
+    return await aredis.hgetall(core.fingerprint_key(encounter_id))
+
+async def store_fingerprints(encounter_id, normalize_fp, vector_fp):
+    key = core.fingerprint_key(encounter_id)
+    async with aredis.pipeline(transaction=False) as pipe:
+        pipe.hset(key, "vector", vector_fp)
+        if normalize_fp:
+            pipe.hset(key, "normalize", normalize_fp)
+        else:
+            pipe.hdel(key, "normalize")
+        await pipe.execute()
+
+# =========================
+# SEARCH CACHE
+# =========================
+async def search_cache_key(query_text, scope, hospital_id, view):
+    normalized_query, scope, hospital_id = core.normalize_search_key(query_text, scope, hospital_id)
+    generation = await aredis.get(core._search_generation_key(hospital_id)) or "0"
+    return (normalized_query, scope, hospital_id, view, generation, await active_index_base())
+
+async def invalidate_search_cache(hospital_ids):
+    async with aredis.pipeline(transaction=False) as pipe:
+        pipe.incr(core._search_generation_key())
+        for hospital_id in set(hospital_ids):
+            pipe.incr(core._search_generation_key(hospital_id))
+        await pipe.execute()
+
+# =========================
+# RETRIEVAL
+# =========================
+def _prefilter(results, hospital_id):
+    # Same cheap hospital_tag check as app._scope_candidates, before any decrypt
+    expected_tag = core.hospital_tag(hospital_id) if hospital_id is not None else None
+    kept = []
+    for r in results:
+        metadata = r.get("metadata") or {}
+        if not metadata.get("secure_blob"):
+            continue
+        tag = metadata.get("hospital_tag")
+        if expected_tag and tag is not None and tag != expected_tag:
+            continue
+        kept.append(r)
+    return kept
+
+def _decrypt_all(results):
+    with metrics.timed("decrypt"):
+        return [core.decrypt_metadata(r["metadata"]["secure_blob"]) for r in results]
+
+async def _timed_load_encounters(eids, expand, fields):
+    with metrics.timed("redis_hydrate"):
+        return await load_encounters(eids, expand, fields)
+
+async def save_record(encounter_id, record):
+    # Full record and search card together, as app.save_record does
+    await aredis_records.mset({
+        core.encounter_key(encounter_id): record_codec.encode(record),
+        core.card_key(encounter_id): record_codec.encode(core.build_search_card(record))
+    })
+
+async def load_records(keys):
+    blobs = await aredis_records.mget(keys)
+    records, legacy = [], []
+
+    for key, blob in zip(keys, blobs):
+        record = record_codec.decode(blob)
+        records.append(record)
+        if blob is not None and record_codec.is_legacy(blob):
+            legacy.append((key, blob, record))
+
+    if legacy:
+        await asyncio.gather(*(
+            migrate_record(keys=[key], args=[blob, record_codec.encode(record)])
+            for key, blob, record in legacy
+        ), return_exceptions=True)
+
+    return records
+
+async def load_encounters(eids, expand, fields):
+    """
+    Async counterpart of app.hydrate_matches' Redis side: cards by default
+    (backfilling missing ones), projected full records otherwise.
+    """
+    if expand or fields:
+        records = await load_records([core.encounter_key(eid) for eid in eids])
+        return [
+            core.project_record(record, expand, fields) if record else None
+            for record in records
+        ]
+
+    cards = [
+        record_codec.decode(blob)
+        for blob in await aredis_records.mget([core.card_key(eid) for eid in eids])
+    ]
+
+    missing = [i for i, card in enumerate(cards) if card is None]
+    if missing:
+        records = await load_records([core.encounter_key(eids[i]) for i in missing])
+        backfill = {}
+        for i, record in zip(missing, records):
+            if record is not None:
+                cards[i] = core.build_search_card(record)
+                backfill[core.card_key(eids[i])] = record_codec.encode(cards[i])
+        if backfill:
+            await aredis_records.mset(backfill)
+
+    return cards
+
+async def scope_and_hydrate(results, hospital_id=None, view=(False, ()), decrypted=None, hydrated=None):
+    """
+    Decrypts metadata (in a worker thread) while the Redis MGET for the same
+    ids is in flight, then keeps in-scope hits in rank order. `decrypted`
+    and `hydrated` memoize across over-fetch pages, as in app._scope_candidates.
+    """
+    kept = _prefilter(results, hospital_id)
+    if not kept:
+        return []
+
+    decrypted = {} if decrypted is None else decrypted
+    hydrated = {} if hydrated is None else hydrated
+    eids = [r["id"].replace("encounter:", "") for r in kept]
+
+    async def decrypt():
+        fresh = [r for r in kept if r["id"] not in decrypted]
+        if fresh:
+            decrypted.update(zip((r["id"] for r in fresh), await asyncio.to_thread(_decrypt_all, fresh)))
+
+    async def hydrate():
+        missing = list(dict.fromkeys(eid for eid in eids if eid not in hydrated))
+        if missing:
+            hydrated.update(zip(missing, await _timed_load_encounters(missing, *view)))
+
+    await asyncio.gather(decrypt(), hydrate())
+
+    return [
+        core.build_match(eid, decrypted[r["id"]], r, hydrated[eid])
+        for r, eid in zip(kept, eids)
+        if hydrated[eid] and (hospital_id is None or decrypted[r["id"]].get("hospital_id") == hospital_id)
+    ]
+
+def _merge_matches(*groups):
+    # Union by encounter id, closest first (as app._merge_candidates)
+    merged = {}
+    for group in groups:
+        for match in group:
+            merged.setdefault(match["encounter_id"], match)
+    return sorted(merged.values(), key=lambda m: m["score"])
+
+async def retrieve_matches(query_text, scope, hospital_id, view=(False, ()), deadline=None):
+    """
+    Mirrors app.retrieve_candidates + hydrate_matches: concurrent shard
+    fan-out for global scope; for local, the tag filter, plus adaptive
+    over-fetch merged in when LOCAL_SEARCH_LEGACY_OVERFETCH is on.
+    """
+    base = await active_index_base()
+
+    if scope != "local":
+        outcomes = await asyncio.gather(*(
+            timed_query(query_text, core.SEARCH_TOP_K, None, index_name, deadline)
+            for index_name in core.all_index_names(base)
+        ))
+        stats = [stat for _, stat in outcomes]
+        if all("error" in stat for stat in stats):
+            raise core.VectorSearchError("; ".join(stat["error"] for stat in stats))
+
+        merged = sorted(
+            (r for results, _ in outcomes for r in results),
+            key=lambda r: float(r.get("distance", 0))
+        )[:core.SEARCH_TOP_K]
+        return await scope_and_hydrate(merged, view=view), stats
+
+    index_name = core.index_for_hospital(hospital_id, base)
+    stats = []
+    decrypted, hydrated = {}, {}
+
+    if core.LOCAL_SEARCH_MODE == "filter":
+        results, stat = await timed_query(
+            query_text,
+            core.SEARCH_TOP_K,
+            {"hospital_tag": {"$eq": core.hospital_tag(hospital_id)}},
+            index_name,
+            deadline
+        )
+        stats.append(stat)
+        if "error" in stat:
+            raise core.VectorSearchError(stat["error"])
+
+        found = await scope_and_hydrate(results, hospital_id, view, decrypted, hydrated)
+        # A short filtered set is complete (see app.retrieve_candidates)
+        if (
+            not core.LOCAL_SEARCH_LEGACY_OVERFETCH
+            or len(found) >= core.SEARCH_RESULT_LIMIT
+            or (deadline is not None and deadline.expired)
+        ):
+            return found, stats
+    else:
+        found = []
+
+    top_k = core.SEARCH_TOP_K
+    while True:
+        results, stat = await timed_query(query_text, top_k, None, index_name, deadline)
+        stats.append(stat)
+        if "error" in stat:
+            raise core.VectorSearchError(stat["error"])
+
+        matches = _merge_matches(found, await scope_and_hydrate(results, hospital_id, view, decrypted, hydrated))
+        if (
+            len(matches) >= core.SEARCH_RESULT_LIMIT
+            or len(results) < top_k
+            or top_k >= core.LOCAL_SEARCH_MAX_TOP_K
+            or (deadline is not None and deadline.expired)
+        ):
+            return matches, stats
+
+        top_k = min(top_k * 2, core.LOCAL_SEARCH_MAX_TOP_K)
+
+async def lexical_matches(query_text, scope, hospital_id, view, error):
+    # Fallback retrieval from app.py's lexical index, hydrated like vector hits
+    candidates, stat = core.lexical_candidates(query_text, scope, hospital_id)
+    encounters = await _timed_load_encounters([eid for eid, _, _ in candidates], *view)
+    matches = [
+        core.build_match(eid, meta, r, encounter)
+        for (eid, meta, r), encounter in zip(candidates, encounters)
+        if encounter
+    ]
+    return matches, [{**stat, "vector_error": str(error)}]
+
+# =========================
+# ROUTES
+# =========================
+def _route_label():
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+@app.before_request
+async def _track_request_start():
+    g.request_started = time.perf_counter()
+    metrics.in_flight.inc(name=_route_label())
+
+@app.after_request
+async def _track_request_end(response):
+    route = _route_label()
+    metrics.requests_total.inc(route=route, status=response.status_code)
+    # Errors are counted once, in teardown: an unhandled exception also
+    # reaches here as a 500
+    g.response_status = response.status_code
+    metrics.request_seconds.observe(time.perf_counter() - g.request_started, route=route)
+    return response
+
+@app.teardown_request
+async def _track_request_teardown(exc):
+    if "request_started" not in g:
+        return
+    metrics.in_flight.dec(name=_route_label())
+    if exc is not None or g.get("response_status", 0) >= 500:
+        metrics.errors_total.inc(route=_route_label())
+
+@app.route("/metrics", methods=["GET"])
+async def metrics_endpoint():
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/upsert-encounter", methods=["POST"])
+async def upsert_encounter():
+    try:
+        body = await request.get_json()
+        encounter, encounter_id, hospital_id = core.prepare_encounter(body)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if request.args.get("mode") == "async" or "respond-async" in request.headers.get("Prefer", ""):
+        job_id = await asyncio.to_thread(core.enqueue_upsert_job, encounter, encounter_id, hospital_id)
+        if job_id is None:
+            return jsonify({"error": "upsert queue is full"}), 503, {"Retry-After": "5"}
+
+        return jsonify({
+            "status": "queued",
+            "job_id": job_id,
+            "encounter_id": encounter_id,
+            "status_url": f"/jobs/{job_id}"
+        }), 202
+
+    deadline = core.request_deadline(request.headers, body)
+    skipped, degraded = [], []
+    fingerprints = await load_fingerprints(encounter_id)
+
+    # 1. Normalize using Gemini, unless the clinical input is unchanged
+    #    (or too little budget is left, as in app.process_encounter)
+    normalize_fp = core.normalization_fingerprint(encounter)
+    normalized = None
+    if fingerprints.get("normalize") == normalize_fp:
+        record = (await load_records([core.encounter_key(encounter_id)]))[0]
+        normalized = record.get("summary") if record else None
+
+    if normalized is not None:
+        skipped.append("normalize")
+    elif deadline.remaining_ms() < core.NORMALIZE_MIN_BUDGET_MS:
+        normalized, normalize_fp = core.normalization_fallback(encounter), None
+        degraded.append("normalize")
+    else:
+        normalized, from_llm = await normalize_encounter(encounter, deadline)
+        if not from_llm:
+            normalize_fp = None
+            degraded.append("normalize")
+
+    # 2. Store summary and 3-5. upsert vectors concurrently (unless unchanged)
+    semantic_text = core.build_semantic_text(normalized)
+    vector_fp = core.vector_fingerprint(hospital_id, semantic_text, await active_index_base())
+
+    writes = [save_record(encounter_id, {
+        "raw_encounter": encounter,
+        "summary": normalized
+    })]
+    if fingerprints.get("vector") == vector_fp:
+        skipped.append("vector_upsert")
+    else:
+        item = await asyncio.to_thread(core.build_vector_item, encounter_id, hospital_id, semantic_text)
+        writes.append(upsert_vectors([(hospital_id, item)], deadline))
+
+    try:
+        await asyncio.gather(*writes)
+    except httpx.TimeoutException as e:
+        return jsonify({
+            "error": "Request deadline exceeded",
+            "details": str(e)
+        }), 504
+    await store_fingerprints(encounter_id, normalize_fp, vector_fp)
+    if "vector_upsert" not in skipped:
+        await asyncio.to_thread(core.index_lexical, [(encounter_id, hospital_id, semantic_text)])
+
+    if len(skipped) < 2:
+        await invalidate_search_cache([hospital_id])
+
+    return jsonify({
+        "status": "stored",
+        "encounter_id": encounter_id,
+        "skipped": skipped,
+        "degraded": bool(degraded),
+        "degraded_stages": degraded
+    })
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+async def get_job(job_id):
+    job = await aredis.hgetall(core._job_key(job_id))
+    if not job:
+        return jsonify({"error": "job not found"}), 404
+
+    job.pop("payload", None)
+    return jsonify(job)
+
+@app.route("/search-advanced", methods=["POST"])
+async def search():
+    d = await request.get_json()
+    query_text = d.get("query", "")
+    view = core.search_view(d)
+    deadline = core.request_deadline(request.headers, d)
+
+    cache_key = None
+    if core.search_cache.enabled:
+        cache_key = await search_cache_key(query_text, d.get("scope"), d.get("hospital_id"), view)
+        cached = core.search_cache.get(cache_key)
+        metrics.cache_lookup("search", hit=cached is not None)
+        if cached is not None:
+            return jsonify({**cached, "cached": True, "degraded": False})
+
+    retrieval = "vector"
+    try:
+        matches, shard_stats = await retrieve_matches(
+            query_text, d.get("scope"), d.get("hospital_id"), view, core.vector_deadline(deadline)
+        )
+    except core.VectorSearchError as e:
+        if not core.lexical_fallback_available():
+            body, status = core.vector_search_failed(e, deadline)
+            return jsonify(body), status
+        logger.warning("⚠️ Vector search failed, answering from the lexical index: %s", e)
+        matches, shard_stats = await lexical_matches(query_text, d.get("scope"), d.get("hospital_id"), view, e)
+        retrieval = "lexical"
+
+    if retrieval == "vector" and core.lexical_rerank_enabled():
+        with metrics.timed("lexical_rerank"):
+            order = core.lexical_rerank_order(query_text, [(m["encounter_id"], m["score"]) for m in matches])
+            matches = [matches[i] for i in order]
+
+    final = matches[:core.SEARCH_RESULT_LIMIT]
+
+    # Synthesis is optional: skipped when the budget is nearly spent
+    degraded = False
+    synthesis = {}
+    if final and deadline.remaining_ms() < core.SYNTHESIS_MIN_BUDGET_MS:
+        synthesis, degraded = dict(core.SYNTHESIS_FALLBACK), True
+    elif final:
+        synthesis = await synthesize_answer(query_text, final, deadline)
+        degraded = synthesis == core.SYNTHESIS_FALLBACK
+
+    response = {
+        "matches": final,
+        "synthesis": synthesis,
+        "retrieval": retrieval
+    }
+    core.store_search_result(cache_key, response)
+
+    return jsonify({
+        **response,
+        "cached": False,
+        "degraded": degraded or retrieval == "lexical",
+        "shards": shard_stats
+    })
+
+@app.route("/encounters/<encounter_id>", methods=["GET"])
+async def get_encounter(encounter_id):
+    record = (await load_records([core.encounter_key(encounter_id)]))[0]
+    if record is None:
+        return jsonify({"error": "encounter not found"}), 404
+
+    encounter = core.flatten_record(record)
+    if str(encounter.get("hospital")) != request.args.get("hospital_id"):
+        return jsonify({"error": "encounter belongs to another hospital"}), 403
+
+    return jsonify({
+        "encounter_id": encounter_id,
+        "encounter": encounter
+    })
+
+@app.route("/health", methods=["GET"])
+async def health():
+    return jsonify({
+        "status": "ok",
+        "mode": "asyncio",
+        "index_name": core.INDEX_NAME,
+        "active_index": await active_index_base(),
+        "cyborgdb_transport": cyborg_http.stats(),
+        "llm_governor": core.llm_governor.stats(),
+        "embedder": core.embedder.stats() if core.embedder else None,
+        "lexical_index": core.lexical_stats()
+    })
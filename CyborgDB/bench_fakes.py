@@ -0,0 +1,292 @@
+"""
+MedSec – Local stand-ins for benchmarking
+A stub CyborgDB REST server, an in-memory Redis and a canned Gemini client,
+so app.py can be imported and driven without any live service.
+"""
+
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text):
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def _strings(value):
+    # String leaves of a JSON value, so canned summaries echo content, not keys
+    if isinstance(value, dict):
+        for v in value.values():
+            yield from _strings(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from _strings(v)
+    elif isinstance(value, str):
+        yield value
+
+
+# =========================
+# CYBORGDB STUB
+# =========================
+class StubCyborgDB:
+    """
+    Serves /v1/indexes/* and /v1/vectors/{upsert,query} from memory.
+    Queries rank by cosine similarity of bag-of-words vectors (or of the
+    supplied vectors), honour {"field": {"$eq": v}} filters, and sleep
+    `latency_ms` per call to mimic the real service.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self.indexes = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    # -------------------------
+    # HANDLERS
+    # -------------------------
+    def list_indexes(self, _body):
+        with self.lock:
+            return 200, {"indexes": list(self.indexes)}
+
+    def create_index(self, body):
+        with self.lock:
+            if body["index_name"] in self.indexes:
+                return 409, {"detail": "Index already exists"}
+            self.indexes[body["index_name"]] = {}
+        return 200, {"status": "success"}
+
+    def delete_index(self, body):
+        with self.lock:
+            if self.indexes.pop(body["index_name"], None) is None:
+                return 404, {"detail": "Index not found"}
+        return 200, {"status": "success"}
+
+    def upsert(self, body):
+        with self.lock:
+            index = self.indexes.setdefault(body["index_name"], {})
+            for item in body.get("items", []):
+                vector = item.get("vector") or self._bow(item.get("contents", ""))
+                index[item["id"]] = (vector, item.get("metadata") or {})
+        return 200, {"status": "success", "upserted_count": len(body.get("items", []))}
+
+    def query(self, body):
+        query = body.get("query_vectors") or self._bow(body.get("query_contents", ""))
+        filters = body.get("filters") or {}
+
+        with self.lock:
+            items = list(self.indexes.get(body["index_name"], {}).items())
+
+        scored = []
+        for item_id, (vector, metadata) in items:
+            if not self._matches(metadata, filters):
+                continue
+            scored.append((1.0 - self._cosine(query, vector), item_id, metadata))
+
+        scored.sort(key=lambda x: x[0])
+        results = [
+            {"id": item_id, "distance": distance, "metadata": metadata}
+            for distance, item_id, metadata in scored[:body.get("top_k", 10)]
+        ]
+        return 200, {"results": results}
+
+    @staticmethod
+    def _bow(text):
+        counts = {}
+        for token in _tokens(text):
+            counts[token] = counts.get(token, 0) + 1
+        return counts
+
+    @staticmethod
+    def _cosine(a, b):
+        if isinstance(a, dict):
+            dot = sum(v * b.get(k, 0) for k, v in a.items())
+            na = math.sqrt(sum(v * v for v in a.values()))
+            nb = math.sqrt(sum(v * v for v in b.values()))
+        else:
+            dot = sum(x * y for x, y in zip(a, b))
+            na = math.sqrt(sum(x * x for x in a))
+            nb = math.sqrt(sum(y * y for y in b))
+        return dot / (na * nb) if na and nb else 0.0
+
+    @staticmethod
+    def _matches(metadata, filters):
+        for field, cond in filters.items():
+            expected = cond.get("$eq") if isinstance(cond, dict) else cond
+            if metadata.get(field) != expected:
+                return False
+        return True
+
+    def _handler(self):
+        stub = self
+        routes = {
+            ("GET", "/v1/indexes/list"): self.list_indexes,
+            ("POST", "/v1/indexes/create"): self.create_index,
+            ("POST", "/v1/indexes/delete"): self.delete_index,
+            ("POST", "/v1/vectors/upsert"): self.upsert,
+            ("POST", "/v1/vectors/query"): self.query,
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                if stub.latency_ms:
+                    time.sleep(stub.latency_ms / 1000)
+
+                route = routes.get((method, self.path))
+                status, payload = route(body) if route else (404, {"detail": "Not found"})
+
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+# =========================
+# REDIS
+# =========================
+def patch_redis():
+    """
+    Makes redis.from_url / redis.asyncio.from_url hand out fakeredis clients
+    that share one in-memory server. Call before importing app.
+    """
+    import fakeredis
+    import redis
+    import redis.asyncio
+
+    server = fakeredis.FakeServer()
+
+    def from_url(url, **kwargs):
+        return fakeredis.FakeRedis(server=server, decode_responses=kwargs.get("decode_responses", False))
+
+    def async_from_url(url, **kwargs):
+        return fakeredis.FakeAsyncRedis(server=server, decode_responses=kwargs.get("decode_responses", False))
+
+    redis.from_url = from_url
+    redis.asyncio.from_url = async_from_url
+    return server
+
+
+# =========================
+# GEMINI
+# =========================
+class _CannedResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def _canned_summary(encounter):
+    # Echo the encounter's own words so summaries (and searches) differ per record
+    words = _tokens(" ".join(_strings(encounter)))[:40]
+    return {
+        "narrative_summary": " ".join(words[:20]),
+        "diagnoses": [" ".join(words[:3])] if words else [],
+        "chief_complaint": " ".join(words[3:10]),
+        "key_findings": " ".join(words[10:20]),
+        "medications": words[20:24],
+        "abnormal_labs": [],
+        "imaging_findings": [],
+        "plan_and_outcome": " ".join(words[24:40])
+    }
+
+
+class CannedGemini:
+    """
+    Stands in for google.genai.Client: answers normalization prompts with a
+    JSON summary and synthesis prompts with the three tagged sections, after
+    sleeping `latency_ms`.
+    """
+
+    def __init__(self, latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self.models = self
+        self.aio = _AsyncCannedGemini(self)
+
+    def reply(self, contents):
+        self.calls += 1
+
+        if "Encounters JSON:" in contents:
+            batch = json.loads(contents.split("Encounters JSON:", 1)[-1])
+            return json.dumps({key: _canned_summary(enc) for key, enc in batch.items()})
+
+        if "normalization engine" in contents:
+            payload = contents.split("Encounter JSON:", 1)[-1]
+            try:
+                return json.dumps(_canned_summary(json.loads(payload)))
+            except ValueError:
+                return json.dumps(_canned_summary(payload))
+
+        # Separate sections with blank lines so parse_synthesis splits them cleanly
+        return (
+            "[INSIGHTS]\nSimilar presentations across the consortium.\n\n"
+            "[MANAGEMENT]\nStandard protocol was effective.\n\n"
+            "[NEXT_STEPS]\nConfirm with local guidelines.\n"
+        )
+
+    def generate_content(self, model=None, contents=""):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return _CannedResponse(self.reply(contents))
+
+
+class _AsyncCannedGemini:
+    def __init__(self, parent):
+        self.parent = parent
+        self.models = self
+
+    async def generate_content(self, model=None, contents=""):
+        import asyncio
+
+        if self.parent.latency_ms:
+            await asyncio.sleep(self.parent.latency_ms / 1000)
+        return _CannedResponse(self.parent.reply(contents))
+
+
+def patch_gemini(latency_ms=0.0):
+    """
+    Makes google.genai.Client() return one shared CannedGemini.
+    Call before importing app.
+    """
+    from google import genai
+
+    canned = CannedGemini(latency_ms)
+    genai.Client = lambda *args, **kwargs: canned
+    return canned
@@ -0,0 +1,152 @@
+"""
+MedSec – Record codec benchmark
+Compares bytes per record and encode/decode time of the legacy JSON
+encounter format against each record_codec format.
+
+Usage:
+    python bench_record_codec.py                      # records built from MOCK_DATA
+    python bench_record_codec.py --redis-url URL      # sample live encounter:* keys
+    python bench_record_codec.py --json               # machine-readable output
+"""
+
+import argparse
+import json
+import time
+
+import record_codec
+from load_demo_data import MOCK_DATA
+
+
+def demo_records():
+    """
+    Upsert-shaped records (raw encounter + normalized summary) with the
+    nested patient/prescription/vitals payload the backend sends.
+    """
+    records = []
+    for case in MOCK_DATA:
+        raw = case["raw_encounter"]
+        summary = case["summary"]
+        records.append({
+            "raw_encounter": {
+                "_id": case["encounter_id"],
+                "hospital": case["hospital_id"],
+                "encounterType": "outpatient",
+                "startedAt": raw.get("encounter_date"),
+                "chiefComplaint": raw.get("chief_complaint"),
+                "diagnosis": raw.get("diagnosis"),
+                "treatment": raw.get("treatment"),
+                "outcome": raw.get("outcome"),
+                "vitals": {
+                    "temperatureC": 37.1, "pulse": 88, "respiratoryRate": 16,
+                    "systolicBP": 128, "diastolicBP": 82, "spo2": 97,
+                    "heightCm": 172, "weightKg": 74
+                },
+                "patient": {
+                    "_id": f"PAT_{case['encounter_id']}",
+                    "firstName": "Demo", "lastName": "Patient",
+                    "dob": "1990-01-01T00:00:00.000Z", "gender": "unknown",
+                    "allergies": [], "chronicConditions": [],
+                    "hospital": case["hospital_id"]
+                },
+                "prescriptions": [{
+                    "_id": f"RX_{case['encounter_id']}_1",
+                    "items": [
+                        {
+                            "name": med, "dosage": "500 mg", "frequency": "Once daily",
+                            "durationDays": 5, "quantity": 5,
+                            "instructions": "Take after meals"
+                        } for med in summary.get("medications", [])
+                    ]
+                }]
+            },
+            "summary": {
+                "narrative_summary": f"{summary.get('chief_complaint')} - {summary.get('plan_and_outcome')}",
+                "diagnoses": summary.get("diagnoses", []),
+                "chief_complaint": summary.get("chief_complaint"),
+                "key_findings": "",
+                "medications": summary.get("medications", []),
+                "abnormal_labs": [],
+                "imaging_findings": [],
+                "plan_and_outcome": summary.get("plan_and_outcome")
+            }
+        })
+    return records
+
+
+def redis_records(url, sample):
+    import redis
+
+    client = redis.from_url(url)
+    records = []
+    for key in client.scan_iter(match="encounter:*", count=500):
+        records.append(record_codec.decode(client.get(key)))
+        if len(records) >= sample:
+            break
+    return records
+
+
+def measure(records, encode, decode, rounds):
+    blobs = [encode(r) for r in records]
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for r in records:
+            encode(r)
+    encode_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for b in blobs:
+            decode(b)
+    decode_s = time.perf_counter() - started
+
+    n = len(records) * rounds
+    return {
+        "bytes_per_record": round(sum(len(b) for b in blobs) / len(blobs), 1),
+        "encode_us": round(encode_s / n * 1e6, 2),
+        "decode_us": round(decode_s / n * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", help="sample records from this Redis instead of MOCK_DATA")
+    parser.add_argument("--sample", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    records = redis_records(args.redis_url, args.sample) if args.redis_url else demo_records()
+    if not records:
+        raise SystemExit("No records to benchmark")
+
+    formats = {
+        "legacy-json": (lambda r: json.dumps(r).encode(), json.loads),
+        "zlib-json": (lambda r: record_codec.encode(r, record_codec.CODEC_ZLIB_JSON), record_codec.decode),
+    }
+    if record_codec.msgpack and record_codec.zstandard:
+        formats["zstd-msgpack"] = (
+            lambda r: record_codec.encode(r, record_codec.CODEC_ZSTD_MSGPACK),
+            record_codec.decode
+        )
+
+    report = {
+        "records": len(records),
+        "rounds": args.rounds,
+        "formats": {name: measure(records, enc, dec, args.rounds) for name, (enc, dec) in formats.items()},
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    baseline = report["formats"]["legacy-json"]["bytes_per_record"]
+    print(f"📦 {report['records']} records x {report['rounds']} rounds\n")
+    print(f"{'format':<14}{'bytes/rec':>12}{'vs json':>10}{'encode µs':>12}{'decode µs':>12}")
+    for name, m in report["formats"].items():
+        ratio = m["bytes_per_record"] / baseline
+        print(f"{name:<14}{m['bytes_per_record']:>12}{ratio:>9.0%} {m['encode_us']:>11}{m['decode_us']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+MedSec – Hermetic service benchmark
+Drives /upsert-encounter and /search-advanced at a fixed concurrency against
+local stand-ins (stub CyborgDB REST server, in-memory Redis, canned Gemini
+from bench_fakes), so runs are repeatable and need no network or API keys.
+
+Reports throughput, p50/p95/p99 latency and a per-stage breakdown taken
+from the metrics registry for each scenario.
+
+Usage:
+    python bench_service.py                                  # both scenarios
+    python bench_service.py --scenarios search --requests 2000 --concurrency 32
+    python bench_service.py --vector-latency-ms 20 --llm-latency-ms 400
+    python bench_service.py --json --output bench.json       # machine-readable
+
+Requires the service dependencies plus fakeredis (requirements-bench.txt).
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import bench_fakes
+import synth_corpus
+from load_demo_data import MOCK_DATA
+
+SCENARIOS = ("upsert", "search")
+
+
+# =========================
+# ENVIRONMENT
+# =========================
+def start_service(args):
+    """
+    Starts the stand-ins, imports app against them and serves it on a
+    threaded local WSGI server. Returns (app_module, base_url, stub, gemini).
+    """
+    stub = bench_fakes.StubCyborgDB(latency_ms=args.vector_latency_ms).start()
+
+    # Must be set before app is imported: config is read at import time.
+    # dotenv never overrides variables that are already set.
+    os.environ.update({
+        "CYBORGDB_URL": stub.url,
+        "CYBORGDB_API_KEY": "bench",
+        "REDIS_URL": "redis://bench",
+        "GEMINI_API_KEY": "bench",
+        "INDEX_NAME": "medsec-bench",
+        "SEED_ON_STARTUP": "false",
+        "UPSERT_WORKERS": "0",
+        "CYBORGDB_POOL_SIZE": str(max(args.concurrency, 20)),
+        "LLM_CACHE_TTL": os.environ.get("LLM_CACHE_TTL", "604800") if args.llm_cache else "0",
+        "SEARCH_CACHE_TTL": os.environ.get("SEARCH_CACHE_TTL", "300") if args.search_cache else "0",
+        "EMBEDDER": os.environ.get("EMBEDDER", "stub"),
+    })
+
+    bench_fakes.patch_redis()
+    gemini = bench_fakes.patch_gemini(latency_ms=args.llm_latency_ms)
+
+    logging.disable(logging.INFO)
+    import app as service
+
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, service.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return service, f"http://127.0.0.1:{server.server_port}", stub, gemini
+
+
+# =========================
+# WORKLOADS
+# =========================
+def encounter_payload(n):
+    """
+    Backend-shaped encounter built from the n-th demo template, with a
+    unique id so every upsert writes a new record.
+    """
+    case = MOCK_DATA[n % len(MOCK_DATA)]
+    raw = case["raw_encounter"]
+    return {
+        "_id": f"BENCH_{n:07d}",
+        "hospital": case["hospital_id"],
+        "encounterType": "outpatient",
+        "startedAt": raw.get("encounter_date"),
+        "chiefComplaint": raw.get("chief_complaint"),
+        "diagnosis": raw.get("diagnosis"),
+        "treatment": raw.get("treatment"),
+        "outcome": raw.get("outcome"),
+    }
+
+
+def search_payload(n):
+    # Alternate global and local scope so both retrieval paths are exercised
+    case = MOCK_DATA[n % len(MOCK_DATA)]
+    payload = {"query": case["raw_encounter"]["chief_complaint"]}
+    if n % 2:
+        payload.update(scope="local", hospital_id=case["hospital_id"])
+    return payload
+
+
+WORKLOADS = {
+    "upsert": ("/upsert-encounter", encounter_payload),
+    "search": ("/search-advanced", search_payload),
+}
+
+
+def prime_corpus(base_url, size, hospitals):
+    """
+    Loads `size` synthetic encounters through the bulk route so searches
+    have something to rank. Not measured.
+    """
+    ok, failed = synth_corpus.post_bulk(synth_corpus.generate(size, hospitals), base_url, 500, 4)
+    if failed:
+        raise SystemExit(f"Corpus load failed for {failed} of {size} encounters")
+
+
+# =========================
+# DRIVER
+# =========================
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(service, base_url, name, total, concurrency):
+    path, make_payload = WORKLOADS[name]
+    service.metrics.stage_seconds.reset()
+
+    counter = itertools.count()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker():
+        session = requests.Session()
+        while True:
+            n = next(counter)
+            if n >= total:
+                return
+
+            started = time.perf_counter()
+            try:
+                status = session.post(f"{base_url}{path}", json=make_payload(n)).status_code
+            except requests.exceptions.RequestException:
+                status = "error"
+            elapsed = time.perf_counter() - started
+
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    stages = {
+        dict(key)["stage"]: {
+            "count": s["count"],
+            "mean_ms": round(s["mean"] * 1000, 3),
+            "p50_ms": round(s["p50"] * 1000, 3),
+            "p95_ms": round(s["p95"] * 1000, 3),
+            "p99_ms": round(s["p99"] * 1000, 3),
+        }
+        for key, s in service.metrics.stage_seconds.summary().items()
+    }
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(total / wall, 2) if wall else None,
+        "statuses": statuses,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3),
+        },
+        "stages": dict(sorted(stages.items())),
+    }
+
+
+def print_report(report):
+    cfg = report["config"]
+    print(
+        f"🏁 {cfg['requests']} requests/scenario @ concurrency {cfg['concurrency']} "
+        f"(vector {cfg['vector_latency_ms']} ms, llm {cfg['llm_latency_ms']} ms, "
+        f"corpus {cfg['corpus']})\n"
+    )
+    for name, r in report["scenarios"].items():
+        lat = r["latency_ms"]
+        print(f"▶ {name}: {r['throughput_rps']} req/s  statuses={r['statuses']}")
+        print(f"  latency ms  p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}")
+        print(f"  {'stage':<22}{'count':>8}{'mean ms':>10}{'p95 ms':>10}")
+        for stage, s in r["stages"].items():
+            print(f"  {stage:<22}{s['count']:>8}{s['mean_ms']:>10}{s['p95_ms']:>10}")
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--corpus", type=int, default=1000,
+                        help="encounters loaded before the search scenario")
+    parser.add_argument("--hospitals", type=int, default=len(synth_corpus.DEMO_HOSPITALS),
+                        help="hospitals the corpus is spread across")
+    parser.add_argument("--vector-latency-ms", type=float, default=5.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--search-cache", action="store_true", help="leave the search result cache on")
+    parser.add_argument("--llm-cache", action="store_true", help="leave the LLM response cache on")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    service, base_url, stub, gemini = start_service(args)
+
+    if "search" in scenarios and args.corpus:
+        prime_corpus(base_url, args.corpus, args.hospitals)
+
+    report = {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "corpus": args.corpus,
+            "hospitals": args.hospitals,
+            "vector_latency_ms": args.vector_latency_ms,
+            "llm_latency_ms": args.llm_latency_ms,
+            "search_cache": args.search_cache,
+            "llm_cache": args.llm_cache,
+            "python": platform.python_version(),
+        },
+        "scenarios": {
+            name: run_scenario(service, base_url, name, args.requests, args.concurrency)
+            for name in scenarios
+        },
+        "llm_calls": gemini.calls,
+    }
+    stub.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
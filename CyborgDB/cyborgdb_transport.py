@@ -0,0 +1,277 @@
+"""
+MedSec – CyborgDB REST transport
+One pooled keep-alive session shared by every CyborgDB REST call.
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# Statuses worth retrying: throttling and transient gateway/service errors
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+def _cap_timeout(timeout, remaining):
+    # Works for a single timeout and for (connect, read) pairs
+    if isinstance(timeout, tuple):
+        return tuple(min(t, remaining) for t in timeout)
+    return min(timeout, remaining)
+
+
+def _out_of_budget(deadline, delay):
+    return deadline is not None and time.monotonic() + delay >= deadline
+
+
+class CyborgDBTransport:
+    """
+    Thin wrapper around a requests.Session with a bounded connection pool,
+    separate connect/read timeouts and jittered retries for idempotent calls.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        api_key,
+        pool_size=20,
+        connect_timeout=3.05,
+        read_timeout=30.0,
+        max_retries=3,
+        backoff_base=0.2,
+        backoff_max=5.0,
+    ):
+        self.base_url = (base_url or "").rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+
+        # pool_block=True caps open sockets at pool_size; extra callers wait
+        self.adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=pool_size,
+            pool_block=True,
+            max_retries=0,
+        )
+
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.session.headers.update({
+            "X-API-Key": api_key or "",
+            "Content-Type": "application/json",
+        })
+
+        self._lock = threading.Lock()
+        self._counters = {
+            "requests": 0,
+            "retries": 0,
+            "errors": 0,
+        }
+
+    # -------------------------
+    # REQUESTS
+    # -------------------------
+    def post(self, path, payload, idempotent=True, timeout=None, deadline=None):
+        return self.request("POST", path, json=payload, idempotent=idempotent, timeout=timeout, deadline=deadline)
+
+    def get(self, path, timeout=None, deadline=None):
+        return self.request("GET", path, idempotent=True, timeout=timeout, deadline=deadline)
+
+    def request(self, method, path, idempotent=True, timeout=None, deadline=None, **kwargs):
+        """
+        Sends a request and returns the final requests.Response.
+        Idempotent calls are retried on connection errors and RETRY_STATUSES;
+        non-idempotent calls are only retried when the connection never opened.
+        `deadline` (a time.monotonic() value) caps each attempt's timeouts
+        and ends retrying once the backoff would overrun it.
+        """
+        url = f"{self.base_url}{path}"
+        timeout = timeout or (self.connect_timeout, self.read_timeout)
+        attempts = 1 + max(0, self.max_retries)
+
+        for attempt in range(attempts):
+            delay = self._backoff(attempt)
+            last = attempt == attempts - 1
+            attempt_timeout = timeout
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._bump("errors")
+                    raise requests.exceptions.Timeout("request deadline exceeded")
+                attempt_timeout = _cap_timeout(timeout, remaining)
+
+            self._bump("requests")
+
+            try:
+                resp = self.session.request(method, url, timeout=attempt_timeout, **kwargs)
+            except requests.exceptions.ConnectTimeout:
+                if last or _out_of_budget(deadline, delay):
+                    self._bump("errors")
+                    raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.ReadTimeout):
+                if last or not idempotent or _out_of_budget(deadline, delay):
+                    self._bump("errors")
+                    raise
+            else:
+                if (resp.status_code not in RETRY_STATUSES or last or not idempotent
+                        or _out_of_budget(deadline, delay)):
+                    if resp.status_code >= 500:
+                        self._bump("errors")
+                    return resp
+                resp.close()
+
+            self._bump("retries")
+            time.sleep(delay)
+
+    def _backoff(self, attempt):
+        # "Full jitter": uniform over [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _bump(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    # -------------------------
+    # STATS
+    # -------------------------
+    def stats(self):
+        pools = []
+        manager = self.adapter.poolmanager
+
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                "host": f"{pool.scheme}://{pool.host}:{pool.port}",
+                "max_size": self.pool_size,
+                # Free slots (idle keep-alive sockets or not-yet-opened ones)
+                "available": pool.pool.qsize() if pool.pool is not None else 0,
+                "connections_opened": pool.num_connections,
+                "requests_sent": pool.num_requests,
+            })
+
+        with self._lock:
+            counters = dict(self._counters)
+
+        return {
+            **counters,
+            "connect_timeout": self.connect_timeout,
+            "read_timeout": self.read_timeout,
+            "max_retries": self.max_retries,
+            "pools": pools,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncCyborgDBTransport:
+    """
+    asyncio counterpart of CyborgDBTransport built on httpx.AsyncClient,
+    with the same pool bound, timeouts, retry policy and stats shape.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        api_key,
+        pool_size=100,
+        connect_timeout=3.05,
+        read_timeout=30.0,
+        max_retries=3,
+        backoff_base=0.2,
+        backoff_max=5.0,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+
+        self.client = httpx.AsyncClient(
+            base_url=(base_url or "").rstrip("/"),
+            headers={
+                "X-API-Key": api_key or "",
+                "Content-Type": "application/json",
+            },
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+            ),
+        )
+
+        self._counters = {
+            "requests": 0,
+            "retries": 0,
+            "errors": 0,
+        }
+
+    async def post(self, path, payload, idempotent=True, timeout=None, deadline=None):
+        return await self.request("POST", path, json=payload, idempotent=idempotent, timeout=timeout, deadline=deadline)
+
+    async def get(self, path, timeout=None, deadline=None):
+        return await self.request("GET", path, idempotent=True, timeout=timeout, deadline=deadline)
+
+    async def request(self, method, path, idempotent=True, timeout=None, deadline=None, **kwargs):
+        attempts = 1 + max(0, self.max_retries)
+
+        for attempt in range(attempts):
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+            last = attempt == attempts - 1
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["errors"] += 1
+                    raise httpx.TimeoutException("request deadline exceeded")
+                kwargs["timeout"] = httpx.Timeout(
+                    min(timeout or self.read_timeout, remaining),
+                    connect=min(self.connect_timeout, remaining)
+                )
+            elif timeout is not None:
+                kwargs["timeout"] = timeout
+
+            self._counters["requests"] += 1
+
+            try:
+                resp = await self.client.request(method, path, **kwargs)
+            except httpx.ConnectTimeout:
+                if last or _out_of_budget(deadline, delay):
+                    self._counters["errors"] += 1
+                    raise
+            except (httpx.ConnectError, httpx.ReadTimeout, httpx.RemoteProtocolError):
+                if last or not idempotent or _out_of_budget(deadline, delay):
+                    self._counters["errors"] += 1
+                    raise
+            else:
+                if (resp.status_code not in RETRY_STATUSES or last or not idempotent
+                        or _out_of_budget(deadline, delay)):
+                    if resp.status_code >= 500:
+                        self._counters["errors"] += 1
+                    return resp
+
+            self._counters["retries"] += 1
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        return {
+            **self._counters,
+            "connect_timeout": self.connect_timeout,
+            "read_timeout": self.read_timeout,
+            "max_retries": self.max_retries,
+            "pools": [{"max_size": self.pool_size}],
+        }
+
+    async def close(self):
+        await self.client.aclose()
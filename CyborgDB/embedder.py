@@ -0,0 +1,256 @@
+"""
+MedSec – Pluggable text embedders
+Lets the service compute vectors itself and send them to CyborgDB
+(`vector` / `query_vectors`) instead of asking the server to embed
+`contents` / `query_contents` on every call.
+
+EMBEDDER=server keeps server-side embedding (no embedder at all),
+EMBEDDER=local runs sentence-transformers in-process, and EMBEDDER=stub is
+a deterministic hashing embedder for tests and benchmarks.
+"""
+
+import hashlib
+import math
+import re
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+
+import metrics
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # optional
+    SentenceTransformer = None
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class Embedder(ABC):
+    """
+    Maps a list of texts to a list of equal-length float vectors.
+    `name` identifies the vector space: vectors from different names must
+    never be mixed in one index or one cache entry.
+    """
+
+    dimension = 0
+
+    @property
+    @abstractmethod
+    def name(self):
+        ...
+
+    @abstractmethod
+    def embed(self, texts):
+        ...
+
+
+class StubEmbedder(Embedder):
+    """
+    Signed feature hashing of word unigrams and bigrams, L2-normalized.
+    Deterministic across processes and machines; texts that share words
+    land close together, which is all tests and benchmarks need.
+    """
+
+    def __init__(self, dimension=768):
+        self.dimension = dimension
+
+    @property
+    def name(self):
+        return f"stub-{self.dimension}"
+
+    def _embed_one(self, text):
+        tokens = TOKEN_RE.findall(str(text).lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = [0.0] * self.dimension
+
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimension] += 1.0 if value >> 63 else -1.0
+
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+    def embed(self, texts):
+        return [self._embed_one(text) for text in texts]
+
+
+class LocalEmbedder(Embedder):
+    """
+    sentence-transformers in-process. Use the index's embedding model so
+    locally computed vectors match what the server would have produced.
+    """
+
+    def __init__(self, model_name, batch_size=32):
+        if SentenceTransformer is None:
+            raise RuntimeError("EMBEDDER=local needs the sentence-transformers package")
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.batch_size = batch_size
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    @property
+    def name(self):
+        return f"local-{self.model_name}"
+
+    def embed(self, texts):
+        vectors = self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return [v.tolist() for v in vectors]
+
+
+def make_embedder(kind, model_name, dimension):
+    """
+    Returns the configured Embedder, or None for server-side embedding.
+    """
+    if kind == "server":
+        return None
+    if kind == "local":
+        return LocalEmbedder(model_name)
+    if kind == "stub":
+        return StubEmbedder(dimension)
+    raise ValueError(f"Unknown EMBEDDER: {kind}")
+
+
+class CachedEmbedder:
+    """
+    Two-tier text -> vector cache in front of an Embedder: a bounded
+    in-process LRU, then Redis (float32 bytes under a hash of the
+    embedder name and text). Only misses on both tiers are embedded, in
+    one batch per call.
+    """
+
+    def __init__(self, embedder, redis_client, max_entries=10000, ttl=2592000):
+        self.embedder = embedder
+        self.redis = redis_client
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"lru_hits": 0, "redis_hits": 0, "embedded": 0}
+
+    @property
+    def name(self):
+        return self.embedder.name
+
+    @property
+    def dimension(self):
+        return self.embedder.dimension
+
+    def _key(self, text):
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        return f"embedding:{self.embedder.name}:{digest}"
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def embed(self, texts):
+        keys = [self._key(text) for text in texts]
+        vectors = [None] * len(texts)
+
+        # 1. In-process LRU
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    vectors[i] = vector
+        lru_hits = sum(1 for v in vectors if v is not None)
+
+        # 2. Redis, for whatever the LRU didn't have
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        redis_hits = 0
+        if missing and self.ttl > 0:
+            try:
+                blobs = self.redis.mget([keys[i] for i in missing])
+            except Exception:
+                blobs = [None] * len(missing)
+
+            for i, blob in zip(missing, blobs):
+                if blob:
+                    vectors[i] = array("f", blob).tolist()
+                    self._remember(keys[i], vectors[i])
+                    redis_hits += 1
+
+        # 3. Embed the rest in one batch (duplicates embedded once)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            with metrics.timed("embed"):
+                computed = dict(zip(unique, self.embedder.embed(unique)))
+
+            pipe = self.redis.pipeline(transaction=False) if self.ttl > 0 else None
+            for text, vector in computed.items():
+                key = self._key(text)
+                self._remember(key, vector)
+                if pipe is not None:
+                    pipe.set(key, array("f", vector).tobytes(), ex=self.ttl)
+            for i in missing:
+                vectors[i] = computed[texts[i]]
+
+            if pipe is not None:
+                try:
+                    pipe.execute()
+                except Exception:
+                    pass  # the cache is an optimization; the vectors are still good
+
+        with self._lock:
+            self._counters["lru_hits"] += lru_hits
+            self._counters["redis_hits"] += redis_hits
+            self._counters["embedded"] += len(missing)
+
+        embedded = set(missing)
+        for i in range(len(texts)):
+            metrics.cache_lookup("embedding", hit=i not in embedded)
+
+        return vectors
+
+    def peek(self, texts):
+        """
+        Cached vectors for `texts` (None where not cached); never embeds.
+        """
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            vectors = [self._lru.get(key) for key in keys]
+
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing and self.ttl > 0:
+            for i, blob in zip(missing, self.redis.mget([keys[i] for i in missing])):
+                if blob:
+                    vectors[i] = array("f", blob).tolist()
+        return vectors
+
+    def prime(self, texts, vectors):
+        """
+        Stores known text -> vector pairs (e.g. from a snapshot) in both tiers.
+        """
+        pipe = self.redis.pipeline(transaction=False) if self.ttl > 0 else None
+        for text, vector in zip(texts, vectors):
+            key = self._key(text)
+            self._remember(key, vector)
+            if pipe is not None:
+                pipe.set(key, array("f", vector).tobytes(), ex=self.ttl)
+        if pipe is not None:
+            pipe.execute()
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counters,
+                "embedder": self.embedder.name,
+                "dimension": self.embedder.dimension,
+                "lru_entries": len(self._lru),
+                "lru_max_entries": self.max_entries,
+            }
@@ -1,13 +1,27 @@
 """
 MedSec – Force Reset Script (Render Compatible)
-Deletes CyborgDB index and flushes Redis
+Deletes the CyborgDB index and the service's own Redis keys.
+
+Never runs FLUSHALL: the same Redis usually backs CyborgDB's own storage
+(see commonErrorFix.txt). Keys are walked with incremental SCAN and removed
+with UNLINK in small batches, so a reset never blocks the server for longer
+than one batch and other keyspaces are left alone.
+
+Usage:
+    python force_reset.py                             # index + every service key group
+    python force_reset.py --scope index               # just the index and state tied to it
+    python force_reset.py --scope llm-cache --scope embeddings
+    python force_reset.py --prefix "job:" --dry-run   # count what would go
+    python force_reset.py --batch 200 --pause-ms 20   # gentler on a busy server
 """
 
+import argparse
 import os
 import time
-import redis
+
 import cyborgdb
 import dotenv
+import redis
 
 # -------------------------------------------
 dotenv.load_dotenv()
@@ -20,50 +34,282 @@ CYBORGDB_URL = os.environ.get("CYBORGDB_URL")   # e.g. http://cyborgdb-service:8
 REDIS_URL = os.environ.get("REDIS_URL")         # redis://red-xxxx:6379
 
 INDEX_NAME = os.environ.get("INDEX_NAME", "medsec-final-v4")
-
-if not CYBORG_API_KEY or not CYBORGDB_URL or not REDIS_URL:
-    raise RuntimeError("❌ Missing required environment variables")
+INDEX_SHARDS = int(os.environ.get("INDEX_SHARDS", "0"))
 
 # =========================
-# CLIENT SETUP
+# KEY SCOPES
 # =========================
-print("🔌 Connecting to CyborgDB...")
-client = cyborgdb.Client(
-    CYBORGDB_URL,
-    api_key=CYBORG_API_KEY
-)
-
-print("🔌 Connecting to Redis...")
-redis_client = redis.from_url(
-    REDIS_URL,
-    decode_responses=True
-)
+# Key prefixes the service writes, by group
+KEY_GROUPS = {
+    "records": ("encounter:", "encounter-card:"),
+    "fingerprints": ("encounter-fp:",),
+    "embeddings": ("embedding:",),
+    "jobs": ("job:", "upsert-jobs:"),
+    "llm-cache": ("llm-cache:",),
+    "lexical": ("lexical-index:",),
+    "seed": ("seed-hashes:",),
+}
+
+# Search results are cached in-process under a Redis generation counter.
+# Deleting the counters would restart them at 0 and could revive old
+# entries, so they are bumped instead.
+SEARCH_GENERATION_PREFIX = "search-cache:gen:"
+
+SCOPES = ("all", "index", "search-cache", *KEY_GROUPS)
+
+
+# Blue/green state written by reindex.py (see app.py INDEX ALIAS)
+ALIAS_KEYS = (f"index-alias:{INDEX_NAME}", f"reindex:{INDEX_NAME}", f"reindex-touched:{INDEX_NAME}")
+
+
+def index_names(bases=(INDEX_NAME,)):
+    names = []
+    for base in dict.fromkeys(bases):
+        if INDEX_SHARDS <= 0:
+            names.append(base)
+        else:
+            names.extend(f"{base}-shard-{n}" for n in range(INDEX_SHARDS))
+    return names
+
+
+def physical_bases(client):
+    """
+    Returns (every base: INDEX_NAME plus whatever the alias and a reindex
+    point at, the live bases: the one being served and any reindex target).
+    """
+    alias, reindex_key, _ = ALIAS_KEYS
+    active, target, previous = [
+        b.decode() if isinstance(b, bytes) else b
+        for b in [client.get(alias), *client.hmget(reindex_key, "target", "previous")]
+    ]
+    active = active or INDEX_NAME
+    bases = [b for b in (INDEX_NAME, active, target, previous) if b]
+    return bases, [b for b in (active, target) if b]
+
+
+def glob_escape(prefix):
+    return "".join(f"\\{c}" if c in "*?[]\\" else c for c in prefix)
+
 
 # =========================
-# FORCE DELETE INDEX
+# REDIS
 # =========================
-print(f"\n🧨 Force Deleting Index: {INDEX_NAME}")
+class KeyReaper:
+    """
+    SCAN + UNLINK in batches of `batch` keys, optionally pausing between
+    batches. Tracks totals for the progress and summary lines.
+    """
+
+    def __init__(self, client, batch=500, pause_ms=0.0, dry_run=False, progress_every=10_000):
+        self.client = client
+        self.batch = batch
+        self.pause = pause_ms / 1000
+        self.dry_run = dry_run
+        self.progress_every = progress_every
+        self.removed = 0
+        self.started = time.perf_counter()
+        self._unlink = True
+
+    def _delete(self, keys):
+        if self.dry_run:
+            return len(keys)
+        try:
+            return self.client.unlink(*keys) if self._unlink else self.client.delete(*keys)
+        except redis.ResponseError as e:
+            # Redis < 4.0 has no UNLINK
+            if not self._unlink or "unknown command" not in str(e).lower():
+                raise
+            self._unlink = False
+            return self.client.delete(*keys)
+
+    def _report(self, before):
+        if self.removed // self.progress_every != before // self.progress_every:
+            print(f"   ⏳ {self.removed} keys, {self.rate():.0f} keys/s")
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return self.removed / elapsed if elapsed else 0.0
+
+    def reap_prefix(self, prefix):
+        """
+        Removes every key starting with `prefix`. Returns the count.
+        """
+        count = 0
+        pending = []
+
+        for key in self.client.scan_iter(match=glob_escape(prefix) + "*", count=self.batch):
+            pending.append(key)
+            if len(pending) >= self.batch:
+                count += self._flush(pending)
+                pending = []
+        if pending:
+            count += self._flush(pending)
+
+        return count
+
+    def reap_keys(self, keys):
+        existing = [key for key in keys if self.client.exists(key)]
+        return self._flush(existing) if existing else 0
+
+    def _flush(self, keys):
+        before = self.removed
+        deleted = self._delete(keys)
+        self.removed += deleted
+        self._report(before)
+        if self.pause:
+            time.sleep(self.pause)
+        return deleted
+
+    def strip_field(self, prefix, field):
+        """
+        HDELs `field` from every hash under `prefix`, keeping the rest.
+        Returns how many hashes had it (dry run: how many hashes there are).
+        """
+        count = 0
+        for keys in _batches(self.client.scan_iter(match=glob_escape(prefix) + "*", count=self.batch), self.batch):
+            if self.dry_run:
+                count += len(keys)
+                continue
+            pipe = self.client.pipeline(transaction=False)
+            for key in keys:
+                pipe.hdel(key, field)
+            count += sum(pipe.execute())
+            if self.pause:
+                time.sleep(self.pause)
+        return count
+
+    def bump_prefix(self, prefix):
+        """
+        INCRs every counter under `prefix` (see SEARCH_GENERATION_PREFIX).
+        """
+        count = 0
+        for keys in _batches(self.client.scan_iter(match=glob_escape(prefix) + "*", count=self.batch), self.batch):
+            if not self.dry_run:
+                pipe = self.client.pipeline(transaction=False)
+                for key in keys:
+                    pipe.incr(key)
+                pipe.execute()
+            count += len(keys)
+        return count
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
-try:
-    client.delete_index(INDEX_NAME)
-    print("✅ CyborgDB index deleted successfully.")
-except Exception as e:
-    print(f"⚠️  Index delete warning (may already be gone): {e}")
 
 # =========================
-# CLEAR REDIS
+# CYBORGDB
 # =========================
-print("\n🧹 Clearing Redis cache...")
-try:
-    redis_client.flushall()
-    print("✅ Redis cache flushed.")
-except Exception as e:
-    print(f"❌ Redis flush failed: {e}")
+def delete_indexes(names, dry_run):
+    print("🔌 Connecting to CyborgDB...")
+    client = cyborgdb.Client(CYBORGDB_URL, api_key=CYBORG_API_KEY)
+
+    for name in names:
+        print(f"\n🧨 Force Deleting Index: {name}")
+        if dry_run:
+            print("   (dry run) skipped")
+            continue
+        try:
+            client.delete_index(name)
+            print("✅ CyborgDB index deleted successfully.")
+        except Exception as e:
+            print(f"⚠️  Index delete warning (may already be gone): {e}")
+
 
 # =========================
-# WAIT & FINISH
+# RESET
 # =========================
-print("\n⏳ Waiting 2 seconds for cleanup...")
-time.sleep(2)
+def plan(scopes, prefixes, indexes, bases=(INDEX_NAME,), live=(INDEX_NAME,)):
+    """
+    Returns (index names to drop, prefixes to unlink, exact keys to unlink,
+    (prefix, hash field) pairs to strip, bump search generations?).
+    """
+    if not scopes:
+        # Bare --prefix / --index runs touch only what they name
+        scopes = (["index"] if indexes else []) if prefixes or indexes else ["all"]
+    scopes = set(scopes)
+    if "all" in scopes:
+        scopes = {"index", "search-cache", *KEY_GROUPS}
+
+    drop = (indexes or index_names(bases)) if "index" in scopes else []
+    unlink = [p for group in KEY_GROUPS if group in scopes for p in KEY_GROUPS[group]]
+    unlink += [p for p in prefixes if p not in unlink]
+    exact, strip = [], []
+
+    # State tied to INDEX_NAME only goes when a served or building index does;
+    # --index naming some other index leaves it alone
+    if "index" in scopes and (not indexes or set(drop) & set(index_names(live))):
+        # Vector fingerprints would make the next upserts skip the new, empty
+        # index (normalization fingerprints stay valid); seed hashes would
+        # make seeding skip it
+        if "encounter-fp:" not in unlink:
+            strip.append(("encounter-fp:", "vector"))
+        if "seed-hashes:" not in unlink:
+            exact.append(f"seed-hashes:{INDEX_NAME}")
+        exact += ALIAS_KEYS
+
+    if "index" in scopes:
+        scopes.add("search-cache")
+
+    return drop, unlink, sorted(set(exact)), strip, "search-cache" in scopes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scope", action="append", choices=SCOPES,
+                        help="what to reset (repeatable; default: all)")
+    parser.add_argument("--prefix", action="append", default=[],
+                        help="extra key prefix to remove (repeatable)")
+    parser.add_argument("--index", action="append", default=[],
+                        help="index to drop with --scope index (default: INDEX_NAME and its shards)")
+    parser.add_argument("--batch", type=int, default=500, help="keys per SCAN page and per UNLINK")
+    parser.add_argument("--pause-ms", type=float, default=0.0, help="sleep between batches")
+    parser.add_argument("--dry-run", action="store_true", help="count keys, delete nothing")
+    args = parser.parse_args()
+
+    if not REDIS_URL or (not args.dry_run and (not CYBORG_API_KEY or not CYBORGDB_URL)):
+        raise RuntimeError("❌ Missing required environment variables")
+
+    print("🔌 Connecting to Redis...")
+    client = redis.from_url(REDIS_URL)
+    reaper = KeyReaper(client, args.batch, args.pause_ms, args.dry_run)
+
+    drop, unlink, exact, strip, bump = plan(args.scope, args.prefix, args.index, *physical_bases(client))
+    verb = "Would remove" if args.dry_run else "Removed"
+
+    if drop:
+        delete_indexes(drop, args.dry_run)
+
+    print("\n🧹 Clearing service keys...")
+    for prefix in unlink:
+        started = time.perf_counter()
+        count = reaper.reap_prefix(prefix)
+        print(f"   {verb} {count} keys under {prefix!r} in {time.perf_counter() - started:.1f}s")
+
+    for prefix, field in strip:
+        count = reaper.strip_field(prefix, field)
+        print(f"   {'Would clear' if args.dry_run else 'Cleared'} {field!r} on {count} keys under {prefix!r}")
+
+    if exact:
+        count = reaper.reap_keys(exact)
+        print(f"   {verb} {count} of {', '.join(exact)}")
+
+    if bump:
+        count = reaper.bump_prefix(SEARCH_GENERATION_PREFIX)
+        print(f"   {'Would invalidate' if args.dry_run else 'Invalidated'} {count} search cache generations")
+
+    print(
+        f"\n✨ {'Dry run' if args.dry_run else 'Reset'} complete: {reaper.removed} keys "
+        f"({reaper.rate():.0f} keys/s). You can safely redeploy or restart the app."
+    )
+
 
-print("✨ Reset complete. You can safely redeploy or restart the app.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+MedSec – In-process lexical index
+BM25 over the same semantic text that is sent to CyborgDB, kept in memory
+and updated one document at a time. Search falls back to it when the
+vector query fails or misses its deadline, and can use it to re-rank
+vector candidates cheaply.
+
+Pure data structure: feeding it (live upserts, rebuild from Redis, the
+cross-process update stream) is app.py's job.
+"""
+
+import heapq
+import math
+import re
+import threading
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(str(text).lower()) if len(t) > 1 or t.isdigit()]
+
+
+class LexicalIndex:
+    """
+    Inverted index: term -> {doc_id: term frequency}. Re-adding a document
+    replaces it, so updates are idempotent and arrive in any order.
+
+    Query terms found in more than `max_df_ratio` of the documents (section
+    headers of the semantic text, "patient", ...) carry almost no BM25
+    weight but walk the longest postings, so they are skipped.
+    """
+
+    def __init__(self, k1=1.2, b=0.75, max_df_ratio=0.9):
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+
+        self._postings = {}
+        self._docs = {}  # doc_id -> (hospital_id, length, {term: tf})
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, doc_id, hospital_id, text):
+        terms = {}
+        for token in tokenize(text):
+            terms[token] = terms.get(token, 0) + 1
+        length = sum(terms.values())
+
+        with self._lock:
+            self._remove(doc_id)
+            self._docs[doc_id] = (hospital_id, length, terms)
+            self._total_length += length
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return
+
+        self._total_length -= doc[1]
+        for term in doc[2]:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+
+    def _query_terms(self, query):
+        # (term, idf, posting) for useful query terms; caller holds the lock
+        n = len(self._docs)
+        out = []
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            if n >= 20 and df > self.max_df_ratio * n:
+                continue
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            out.append((term, idf, posting))
+        return out
+
+    def _term_score(self, idf, tf, length, avg_length):
+        norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+        return idf * tf * (self.k1 + 1) / (tf + norm)
+
+    def search(self, query, top_k=10, hospital_id=None):
+        """
+        Returns up to top_k (doc_id, hospital_id, score), best first.
+        """
+        with self._lock:
+            if not self._docs:
+                return []
+
+            avg_length = self._total_length / len(self._docs) or 1.0
+            scores = {}
+            for _, idf, posting in self._query_terms(query):
+                for doc_id, tf in posting.items():
+                    doc_hospital, length, _ = self._docs[doc_id]
+                    if hospital_id is not None and doc_hospital != hospital_id:
+                        continue
+                    scores[doc_id] = scores.get(doc_id, 0.0) + self._term_score(idf, tf, length, avg_length)
+
+            best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+            return [(doc_id, self._docs[doc_id][0], score) for doc_id, score in best]
+
+    def scores(self, query, doc_ids):
+        """
+        BM25 score of each of `doc_ids` for `query` (0.0 when unknown).
+        Only touches the given documents, so re-ranking stays cheap.
+        """
+        with self._lock:
+            if not self._docs:
+                return {doc_id: 0.0 for doc_id in doc_ids}
+
+            avg_length = self._total_length / len(self._docs) or 1.0
+            terms = self._query_terms(query)
+            out = {}
+            for doc_id in doc_ids:
+                doc = self._docs.get(doc_id)
+                score = 0.0
+                if doc is not None:
+                    for term, idf, _ in terms:
+                        tf = doc[2].get(term)
+                        if tf:
+                            score += self._term_score(idf, tf, doc[1], avg_length)
+                out[doc_id] = score
+            return out
+
+    def stats(self):
+        with self._lock:
+            return {
+                "documents": len(self._docs),
+                "terms": len(self._postings),
+                "avg_length": round(self._total_length / len(self._docs), 1) if self._docs else 0,
+            }
@@ -0,0 +1,315 @@
+"""
+MedSec – LLM call governor
+One gate in front of every Gemini call: a concurrency cap, a token-bucket
+rate limit matched to the provider quota, a per-call deadline and a circuit
+breaker that fails fast while the provider is unhealthy.
+
+Every refusal raises LLMUnavailable, so callers fall through to the same
+fallback they already use for API errors.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+
+class LLMUnavailable(RuntimeError):
+    """
+    Raised instead of calling the provider: breaker open, no slot or rate
+    token within the deadline, or the call itself overran the deadline.
+    """
+
+    def __init__(self, reason, detail=""):
+        super().__init__(f"LLM unavailable ({reason}){': ' + detail if detail else ''}")
+        self.reason = reason
+
+
+def counts_as_failure(exc):
+    """
+    Provider-health errors trip the breaker; a 4xx about our own request
+    (bad prompt, bad key) does not, except throttling and request timeouts.
+    """
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if isinstance(code, int) and 400 <= code < 500 and code not in (408, 429):
+        return False
+    return True
+
+
+class TokenBucket:
+    """
+    Reservation-style bucket: a caller takes its token up front (the level
+    may go negative) and sleeps off the debt, so waiters are served in
+    arrival order without polling. rate <= 0 disables limiting.
+    """
+
+    def __init__(self, rate_per_sec, burst):
+        self.rate = rate_per_sec
+        self.burst = max(1.0, float(burst))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait):
+        """
+        Returns the seconds to wait before using the token, or None (and
+        reserves nothing) if that would exceed max_wait.
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+
+            self._tokens -= 1
+            return wait
+
+    def refund(self):
+        # Returns a reserved token that was never used for a call
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def available(self):
+        if self.rate <= 0:
+            return None
+        with self._lock:
+            elapsed = time.monotonic() - self._updated
+            return round(min(self.burst, self._tokens + elapsed * self.rate), 2)
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half-open after `reset_after` seconds, letting one probe through;
+    the probe's outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_after=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        if self.failure_threshold <= 0:
+            return True
+
+        with self._lock:
+            if self.state == "closed":
+                return True
+
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_after:
+                self.state = "half-open"
+
+            if self.state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half-open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self):
+        # A probe that never reached the provider says nothing about its health
+        with self._lock:
+            self._probing = False
+
+
+class LLMGovernor:
+    """
+    Shared by the sync (thread) and async call paths. The breaker and the
+    bucket are process-wide; the concurrency cap is enforced separately per
+    path, since threads and the event loop can't share one semaphore.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=8,
+        rate_per_minute=0,
+        burst=None,
+        default_timeout=30.0,
+        failure_threshold=5,
+        reset_after=30.0,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.default_timeout = default_timeout
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst or self.max_concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_after)
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="llm"
+        )
+        self._async_slots = None
+
+        self._lock = threading.Lock()
+        self._counters = {
+            "calls": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "rejected_open": 0,
+            "rejected_busy": 0,
+            "rejected_rate": 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _admit(self, deadline):
+        """
+        Breaker + rate checks shared by both paths. Returns the rate wait;
+        the token is refunded if no concurrency slot frees up in time.
+        """
+        if not self.breaker.allow():
+            self._count("rejected_open")
+            raise LLMUnavailable("circuit open")
+
+        wait = self.bucket.reserve(max(0.0, deadline - time.monotonic()))
+        if wait is None:
+            self.breaker.release_probe()
+            self._count("rejected_rate")
+            raise LLMUnavailable("rate limited")
+        return wait
+
+    def _timed_out(self, trip):
+        if trip:
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_probe()
+
+    def _finish(self, exc):
+        if exc is None:
+            self.breaker.record_success()
+        elif counts_as_failure(exc):
+            self._count("failures")
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_probe()
+
+    # -------------------------
+    # SYNC
+    # -------------------------
+    def call(self, fn, timeout=None, trip_on_timeout=True):
+        """
+        Runs fn() under the governor and returns its result. The slot is
+        held until fn really returns, even if the caller already gave up,
+        so abandoned calls still count against the cap. Pass
+        trip_on_timeout=False when the timeout is the caller's own tight
+        budget rather than the provider's normal deadline.
+        """
+        deadline = time.monotonic() + (self.default_timeout if timeout is None else timeout)
+        wait = self._admit(deadline)
+
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic() - wait)):
+            self.bucket.refund()
+            self.breaker.release_probe()
+            self._count("rejected_busy")
+            raise LLMUnavailable("concurrency limit")
+
+        if wait:
+            time.sleep(wait)
+
+        self._count("calls")
+        future = self._executor.submit(fn)
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            self._count("timeouts")
+            self._timed_out(trip_on_timeout)
+            raise LLMUnavailable("deadline exceeded")
+        except Exception as e:
+            self._finish(e)
+            raise
+
+        self._finish(None)
+        return result
+
+    # -------------------------
+    # ASYNC
+    # -------------------------
+    async def acall(self, make_coro, timeout=None, trip_on_timeout=True):
+        """
+        Async twin of call(); make_coro() must return a fresh coroutine.
+        A call that overruns its deadline is cancelled.
+        """
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+
+        deadline = time.monotonic() + (self.default_timeout if timeout is None else timeout)
+        wait = self._admit(deadline)
+
+        try:
+            await asyncio.wait_for(
+                self._async_slots.acquire(),
+                max(0.0, deadline - time.monotonic() - wait)
+            )
+        except asyncio.TimeoutError:
+            self.bucket.refund()
+            self.breaker.release_probe()
+            self._count("rejected_busy")
+            raise LLMUnavailable("concurrency limit")
+        except asyncio.CancelledError:
+            self.bucket.refund()
+            self.breaker.release_probe()
+            raise
+
+        try:
+            if wait:
+                await asyncio.sleep(wait)
+
+            self._count("calls")
+            try:
+                result = await asyncio.wait_for(make_coro(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                self._count("timeouts")
+                self._timed_out(trip_on_timeout)
+                raise LLMUnavailable("deadline exceeded")
+            except Exception as e:
+                self._finish(e)
+                raise
+        finally:
+            self._async_slots.release()
+
+        self._finish(None)
+        return result
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+
+        return {
+            **counters,
+            "breaker": self.breaker.state,
+            "max_concurrency": self.max_concurrency,
+            "rate_per_minute": round(self.bucket.rate * 60, 2),
+            "tokens_available": self.bucket.available(),
+            "default_timeout": self.default_timeout,
+        }
@@ -0,0 +1,235 @@
+"""
+MedSec – In-process metrics
+Minimal Prometheus-style counters, gauges and histograms rendered in the
+text exposition format. Each server process keeps its own registry.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds: sub-ms Redis/decrypt up to multi-second LLM calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, None, v) for key, v in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def summary(self, quantiles=(0.5, 0.95, 0.99)):
+        """
+        Per-series count, mean and bucket-interpolated quantiles, keyed by
+        the label dict as a tuple. Used by the benchmark reports.
+        """
+        out = {}
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                if not count:
+                    continue
+                entry = {"count": count, "mean": total / count}
+                for q in quantiles:
+                    entry[f"p{round(q * 100)}"] = self._quantile(counts, count, q)
+                out[key] = entry
+        return out
+
+    def _quantile(self, counts, count, q):
+        rank = q * count
+        cumulative = 0
+        lower = 0.0
+        for bound, c in zip(self.buckets, counts):
+            if c and cumulative + c >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / c
+            cumulative += c
+            lower = bound
+        # Beyond the last bucket: the best we can say is "at least this"
+        return self.buckets[-1]
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                cumulative = 0
+                for bound, c in zip(self.buckets, counts):
+                    cumulative += c
+                    out.append((f"{self.name}_bucket", key, {"le": bound}, cumulative))
+                out.append((f"{self.name}_bucket", key, {"le": "+Inf"}, count))
+                out.append((f"{self.name}_sum", key, None, total))
+                out.append((f"{self.name}_count", key, None, count))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text):
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name, help_text):
+        return self._register(Gauge(name, help_text))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, buckets))
+
+    def collector(self, fn):
+        """
+        Registers a callback run at scrape time (for values that are cheaper
+        to read on demand, like queue depth or derived ratios).
+        """
+        self._collectors.append(fn)
+        return fn
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception:
+                pass
+
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key, extra)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "medsec_stage_seconds",
+    "Latency of individual pipeline stages"
+)
+request_seconds = registry.histogram(
+    "medsec_request_seconds",
+    "End-to-end request latency per route"
+)
+requests_total = registry.counter(
+    "medsec_requests_total",
+    "Requests handled per route and status"
+)
+errors_total = registry.counter(
+    "medsec_errors_total",
+    "Requests that ended in a 5xx or an unhandled exception"
+)
+in_flight = registry.gauge(
+    "medsec_in_flight",
+    "Requests or calls currently in progress"
+)
+cache_requests = registry.counter(
+    "medsec_cache_requests_total",
+    "Cache lookups by cache and result (hit/miss)"
+)
+cache_hit_ratio = registry.gauge(
+    "medsec_cache_hit_ratio",
+    "Hits / lookups since process start"
+)
+
+
+@contextmanager
+def timed(stage):
+    """
+    Times a block into medsec_stage_seconds{stage=...}; costs two
+    perf_counter calls and one locked update.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - started, stage=stage)
+
+
+def cache_lookup(cache, hit):
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+
+@registry.collector
+def _update_hit_ratios():
+    caches = {dict(key)["cache"] for _, key, _, _ in cache_requests.samples()}
+    for cache in caches:
+        hits = cache_requests.value(cache=cache, result="hit")
+        misses = cache_requests.value(cache=cache, result="miss")
+        if hits + misses:
+            cache_hit_ratio.set(round(hits / (hits + misses), 4), cache=cache)
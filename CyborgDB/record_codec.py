@@ -0,0 +1,115 @@
+"""
+MedSec – Encounter record codec
+Versioned, compressed binary format for the encounter:* values in Redis.
+
+Layout: b"MSR" | version (1 byte) | codec id (1 byte) | body
+Anything without the magic prefix is a legacy plain-JSON record.
+"""
+
+import functools
+import json
+import os
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+MAGIC = b"MSR"
+VERSION = 1
+
+CODEC_ZLIB_JSON = 1
+CODEC_ZSTD_MSGPACK = 2
+
+CODEC_NAMES = {
+    "zlib-json": CODEC_ZLIB_JSON,
+    "zstd-msgpack": CODEC_ZSTD_MSGPACK,
+}
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+@functools.lru_cache(maxsize=None)
+def default_codec():
+    # Resolved on first use so a .env loaded after import still applies
+    name = os.getenv("RECORD_CODEC", "zstd-msgpack")
+    codec = CODEC_NAMES.get(name)
+
+    if codec is None:
+        raise ValueError(f"Unknown RECORD_CODEC: {name}")
+
+    # Fall back rather than fail when the optional packages aren't installed
+    if codec == CODEC_ZSTD_MSGPACK and (msgpack is None or zstandard is None):
+        return CODEC_ZLIB_JSON
+
+    return codec
+
+
+_zstd_c = zstandard.ZstdCompressor(level=ZSTD_LEVEL) if zstandard else None
+_zstd_d = zstandard.ZstdDecompressor() if zstandard else None
+
+
+def encode(record, codec=None):
+    codec = codec or default_codec()
+
+    if codec == CODEC_ZLIB_JSON:
+        body = zlib.compress(
+            json.dumps(record, separators=(",", ":")).encode(),
+            ZLIB_LEVEL
+        )
+    elif codec == CODEC_ZSTD_MSGPACK:
+        body = _zstd_c.compress(msgpack.packb(record, use_bin_type=True))
+    else:
+        raise ValueError(f"Unknown record codec id: {codec}")
+
+    return MAGIC + bytes([VERSION, codec]) + body
+
+
+def is_legacy(blob):
+    if isinstance(blob, str):
+        return True
+    return not blob.startswith(MAGIC)
+
+
+def decode(blob):
+    """
+    Decodes either format; returns None for a missing value.
+    """
+    if blob is None:
+        return None
+
+    if is_legacy(blob):
+        return json.loads(blob)
+
+    version, codec = blob[3], blob[4]
+    body = blob[5:]
+
+    if version != VERSION:
+        raise ValueError(f"Unsupported record version: {version}")
+
+    if codec == CODEC_ZLIB_JSON:
+        return json.loads(zlib.decompress(body))
+
+    if codec == CODEC_ZSTD_MSGPACK:
+        if msgpack is None or zstandard is None:
+            raise RuntimeError("zstd-msgpack record found but msgpack/zstandard are not installed")
+        return msgpack.unpackb(_zstd_d.decompress(body), raw=False)
+
+    raise ValueError(f"Unknown record codec id: {codec}")
+
+
+# Compare-and-set used for lazy migration: only rewrite a legacy value if no
+# newer write landed between our read and the rewrite.
+MIGRATE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('SET', KEYS[1], ARGV[2], 'KEEPTTL')
+end
+return 0
+"""
@@ -0,0 +1,288 @@
+"""
+MedSec – Online reindex with a blue/green switch
+Builds a new physical index (new embedding model or index type) from the
+records in Redis while the current one keeps serving, then atomically
+points the INDEX_NAME alias at it. Searches never see a missing or
+half-built index.
+
+Phases (progress lives in the reindex:<INDEX_NAME> hash, so an
+interrupted run resumes where it stopped):
+
+    building   target created; services dual-write to it; records are
+               copied with SCAN (cursor checkpointed) and parallel chunked
+               upserts, at most --workers chunks in flight
+    switched   alias flipped in one MULTI; ids written meanwhile are replayed
+    done       nothing mirrored any more; old index kept unless --drop-old
+
+--embedding-model only works with EMBEDDER=server, where CyborgDB embeds
+with each index's own model. With a local or stub embedder the service
+embeds queries and writes itself, and it cannot change models in step with
+the alias, so the new index keeps EMBEDDING_MODEL. Either way, set the
+services' EMBEDDING_MODEL to the new model once the switch is done.
+
+Usage:
+    python reindex.py run --embedding-model all-mpnet-base-v2   # EMBEDDER=server
+    python reindex.py run --index-type ivfpq --workers 8 --drop-old
+    python reindex.py status
+    python reindex.py abort          # only before the switch
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import app as core
+
+SCAN_MATCH = "encounter:*"
+
+
+# =========================
+# CHECKPOINT
+# =========================
+def load_state():
+    return core.redis_client.hgetall(core.REINDEX_KEY)
+
+
+def save_state(**fields):
+    fields["updated_at"] = datetime.utcnow().isoformat()
+    core.redis_client.hset(core.REINDEX_KEY, mapping={k: str(v) for k, v in fields.items()})
+
+
+def wait_for_services():
+    # Every process re-reads the alias and target within INDEX_ALIAS_TTL
+    time.sleep(core.INDEX_ALIAS_TTL * 2 + 0.5)
+
+
+# =========================
+# COPY
+# =========================
+def copy_encounters(eids, target):
+    """
+    Re-upserts the current Redis version of `eids` into the target index and
+    records their vector fingerprints for it. Returns how many were copied.
+    """
+    records = core.load_records(eids)
+    entries = [
+        (eid, str(core.flatten_record(record).get("hospital")), core.record_semantic_text(record))
+        for eid, record in zip(eids, records)
+        if record is not None
+    ]
+    if not entries:
+        return 0
+
+    vectors = core.embed_texts([text for _, _, text in entries])
+    routed = [
+        (hospital_id, core.build_vector_item(eid, hospital_id, text, vector))
+        for (eid, hospital_id, text), vector in zip(entries, vectors)
+    ]
+    for index_name, items in core.route_items(routed, target).items():
+        core.cyborgdb_upsert(items, index_name=index_name)
+
+    # Only the vector half: normalization fingerprints stay as they are.
+    # After the switch, unchanged encounters skip their vector upsert.
+    pipe = core.redis_client.pipeline(transaction=False)
+    for eid, hospital_id, text in entries:
+        pipe.hset(core.fingerprint_key(eid), "vector", core.vector_fingerprint(hospital_id, text, target))
+    pipe.execute()
+
+    return len(entries)
+
+
+def copy_all(state, workers, chunk_size):
+    """
+    SCANs encounter:* from the checkpointed cursor. Chunks complete out of
+    order, but the cursor is only advanced past chunks that all finished,
+    so a resume never skips keys (it may redo a few, which is harmless).
+    """
+    target = state["target"]
+    cursor = int(state.get("cursor", 0))
+    copied = resumed = int(state.get("copied", 0))
+    started = time.perf_counter()
+    pending = deque()
+
+    def settle(block):
+        nonlocal copied
+        while pending and (block or pending[0][1].done()):
+            next_cursor, future = pending.popleft()
+            before = copied
+            copied += future.result()  # a failed chunk stops the run here
+            save_state(cursor=next_cursor, copied=copied)
+            block = False
+
+            if copied // 10_000 != before // 10_000:
+                rate = (copied - resumed) / (time.perf_counter() - started)
+                print(f"⏳ {copied} copied ({rate:.0f}/s)", file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            next_cursor, keys = core.record_redis.scan(cursor=cursor, match=SCAN_MATCH, count=chunk_size)
+            if keys:
+                eids = [key.decode()[len("encounter:"):] for key in keys]
+                pending.append((next_cursor, pool.submit(copy_encounters, eids, target)))
+            elif not pending:
+                save_state(cursor=next_cursor, copied=copied)
+
+            # Backpressure: never more than 2x workers chunks queued
+            settle(block=len(pending) >= workers * 2)
+            cursor = next_cursor
+            if cursor == 0:
+                break
+
+        while pending:
+            settle(block=True)
+
+    return copied
+
+
+def replay_touched(target, chunk_size):
+    """
+    Re-copies encounters written while the reindex ran, from their current
+    Redis version. Popped ids go back into the set if their copy fails.
+    """
+    replayed = 0
+    while True:
+        eids = core.redis_client.spop(core.REINDEX_TOUCHED_KEY, chunk_size)
+        if not eids:
+            return replayed
+        try:
+            replayed += copy_encounters(eids, target)
+        except Exception:
+            core.redis_client.sadd(core.REINDEX_TOUCHED_KEY, *eids)
+            raise
+
+
+# =========================
+# COMMANDS
+# =========================
+def start(args):
+    if core.embedder is not None and args.embedding_model not in (None, core.EMBEDDING_MODEL):
+        # Copies, dual-writes and post-switch queries would all embed with
+        # EMBEDDING_MODEL and fill the new index with old-model vectors
+        raise SystemExit(
+            f"--embedding-model needs EMBEDDER=server (EMBEDDER={core.EMBEDDER} embeds with "
+            f"EMBEDDING_MODEL={core.EMBEDDING_MODEL} in every service)"
+        )
+
+    previous = core.active_index_base()
+    target = f"{core.INDEX_NAME}-{datetime.utcnow():%Y%m%d%H%M%S}"
+
+    print(f"🧱 Creating {target} ({args.index_type}, {args.embedding_model or core.EMBEDDING_MODEL})")
+    for index_name in core.all_index_names(target):
+        core.create_index_rest(index_name, core.INDEX_KEY_BYTES, args.embedding_model, args.index_type)
+
+    core.redis_client.delete(core.REINDEX_TOUCHED_KEY, core.REINDEX_KEY)
+    save_state(
+        state="building",
+        target=target,
+        previous=previous,
+        embedding_model=args.embedding_model or core.EMBEDDING_MODEL,
+        index_type=args.index_type,
+        cursor=0,
+        copied=0,
+        started_at=datetime.utcnow().isoformat()
+    )
+
+    # Dual-writes must be on everywhere before the copy passes any key
+    print("⏳ Waiting for services to pick up the dual-write target...")
+    wait_for_services()
+    return load_state()
+
+
+def switch(state):
+    # One MULTI: the alias and the phase change together or not at all
+    pipe = core.redis_client.pipeline(transaction=True)
+    pipe.set(core.INDEX_ALIAS_KEY, state["target"])
+    pipe.hset(core.REINDEX_KEY, mapping={
+        "state": "switched",
+        "switched_at": datetime.utcnow().isoformat()
+    })
+    pipe.execute()
+    print(f"🔀 {core.INDEX_NAME} now points at {state['target']}")
+
+
+def run(args):
+    state = load_state()
+
+    if state.get("state") in ("building", "switched"):
+        print(f"♻️  Resuming reindex into {state['target']} ({state['state']}, {state.get('copied', 0)} copied)")
+    else:
+        state = start(args)
+
+    target = state["target"]
+
+    if state["state"] == "building":
+        if state.get("copy_done") != "1":
+            copied = copy_all(state, args.workers, args.chunk_size)
+            save_state(copy_done=1)
+            print(f"✅ Copied {copied} encounters")
+
+        # Shrinks the window the final replay has to cover
+        replayed = replay_touched(target, args.chunk_size)
+        print(f"🔁 Replayed {replayed} encounters written during the copy")
+
+        switch(state)
+
+    # Processes still on the old alias keep mirroring until they refresh
+    wait_for_services()
+    replayed = replay_touched(target, args.chunk_size)
+    save_state(state="done", finished_at=datetime.utcnow().isoformat())
+    print(f"🔁 Replayed {replayed} encounters written around the switch")
+
+    previous = state.get("previous")
+    if args.drop_old and previous and previous != target:
+        for index_name in core.all_index_names(previous):
+            core.delete_index_rest(index_name, core.INDEX_KEY_BYTES)
+        print(f"🗑️  Dropped {previous}")
+
+    print(f"✨ Reindex complete: serving from {target}")
+
+
+def status(_args):
+    state = load_state()
+    print(json.dumps({
+        "index_name": core.INDEX_NAME,
+        "active_index": core.redis_client.get(core.INDEX_ALIAS_KEY) or core.INDEX_NAME,
+        "touched_pending": core.redis_client.scard(core.REINDEX_TOUCHED_KEY),
+        "reindex": state or None
+    }, indent=2))
+
+
+def abort(_args):
+    state = load_state()
+    if state.get("state") != "building":
+        raise SystemExit(f"Nothing to abort (state: {state.get('state', 'none')})")
+
+    # Stop the dual-writes before the target disappears under them
+    save_state(state="aborted")
+    wait_for_services()
+
+    for index_name in core.all_index_names(state["target"]):
+        core.delete_index_rest(index_name, core.INDEX_KEY_BYTES)
+    core.redis_client.delete(core.REINDEX_TOUCHED_KEY)
+    print(f"🛑 Aborted; dropped {state['target']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="start (or resume) a reindex and switch when done")
+    p_run.add_argument("--embedding-model", help="embedding model of the new index (EMBEDDER=server only; default: EMBEDDING_MODEL)")
+    p_run.add_argument("--index-type", default="ivfflat")
+    p_run.add_argument("--workers", type=int, default=4, help="chunks upserted concurrently")
+    p_run.add_argument("--chunk-size", type=int, default=500, help="keys per SCAN page / upsert")
+    p_run.add_argument("--drop-old", action="store_true", help="delete the previous index after switching")
+
+    sub.add_parser("status", help="print alias and checkpoint")
+    sub.add_parser("abort", help="abandon a reindex that has not switched yet")
+
+    args = parser.parse_args()
+    {"run": run, "status": status, "abort": abort}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+MedSec – Snapshot export / import
+Clones the processed state of an environment (stored encounters, their
+normalized summaries, semantic texts and, when a local embedder cached
+them, vectors) into one file, and bulk-loads such a file into Redis and
+CyborgDB without a single LLM call.
+
+File layout (read through mmap, so import never holds more than the
+chunks in flight):
+
+    MAGIC | chunk | chunk | ... | footer JSON | footer length (8 bytes LE) | MAGIC
+
+Each chunk is a record_codec blob (zstd-msgpack, or zlib-json when those
+packages are missing) holding a list of entries; the footer indexes the
+chunks by offset, length and entry count.
+
+Usage:
+    python snapshot.py export medsec.snap
+    python snapshot.py import medsec.snap --workers 8
+    python snapshot.py info medsec.snap
+
+Running services rebuild their lexical index on start; restart them after
+importing into a live environment.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import metrics
+import record_codec
+
+MAGIC = b"MEDSNAP1"
+FORMAT_VERSION = 1
+TRAILER = struct.Struct("<Q")
+
+
+# =========================
+# FILE FORMAT
+# =========================
+def _pack_vector(vector):
+    # float32 bytes when the chunk codec is binary-safe, plain floats otherwise
+    if vector is None:
+        return None
+    if record_codec.default_codec() == record_codec.CODEC_ZSTD_MSGPACK:
+        return array("f", vector).tobytes()
+    return list(vector)
+
+
+def _unpack_vector(value):
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        return array("f", value).tolist()
+    return value
+
+
+class SnapshotWriter:
+    """
+    Appends chunks as they are produced and writes the footer on close.
+    Output goes to `<path>.tmp` and is renamed into place only when
+    complete, so a crashed export never leaves a truncated snapshot.
+    """
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.chunks = []
+        self.count = 0
+        self._tmp = f"{path}.tmp"
+        self._file = open(self._tmp, "wb")
+        self._file.write(MAGIC)
+
+    def write_chunk(self, entries):
+        if not entries:
+            return
+        blob = record_codec.encode(entries)
+        self.chunks.append([self._file.tell(), len(blob), len(entries)])
+        self._file.write(blob)
+        self.count += len(entries)
+
+    def close(self):
+        footer = json.dumps({
+            **self.meta,
+            "format": FORMAT_VERSION,
+            "count": self.count,
+            "chunks": self.chunks
+        }, separators=(",", ":")).encode()
+
+        self._file.write(footer)
+        self._file.write(TRAILER.pack(len(footer)))
+        self._file.write(MAGIC)
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._tmp)
+
+
+class SnapshotReader:
+    """
+    Memory-maps a snapshot; chunks are decoded on demand from the footer index.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        size = len(self._map)
+        tail = len(MAGIC) + TRAILER.size
+        if size < len(MAGIC) + tail or self._map[:len(MAGIC)] != MAGIC or self._map[-len(MAGIC):] != MAGIC:
+            raise ValueError(f"{path} is not a MedSec snapshot")
+
+        (footer_len,) = TRAILER.unpack(self._map[size - tail:size - len(MAGIC)])
+        self.meta = json.loads(self._map[size - tail - footer_len:size - tail])
+
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format: {self.meta.get('format')}")
+
+    def __len__(self):
+        return self.meta["count"]
+
+    @property
+    def chunk_count(self):
+        return len(self.meta["chunks"])
+
+    def chunk(self, n):
+        offset, length, _ = self.meta["chunks"][n]
+        return record_codec.decode(self._map[offset:offset + length])
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+# =========================
+# EXPORT
+# =========================
+def export_snapshot(path, chunk_size=1000):
+    import app as core
+
+    vector_space = core.embedder.name if core.embedder else None
+    writer = SnapshotWriter(path, {
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "source_index": core.INDEX_NAME,
+        "vector_space": vector_space,
+        "embedding_model": core.EMBEDDING_MODEL,
+        "gemini_model": core.GEMINI_MODEL,
+    })
+    started = time.perf_counter()
+
+    try:
+        for keys in core._scan_batches(core.record_redis, "encounter:*", chunk_size):
+            eids = [key.decode()[len("encounter:"):] for key in keys]
+            records = core.load_records(eids)
+            fingerprints = core.load_fingerprints(eids)
+
+            entries = []
+            for eid, record, fp in zip(eids, records, fingerprints):
+                if record is None:
+                    continue
+                entries.append({
+                    "id": eid,
+                    "hospital": str(core.flatten_record(record).get("hospital")),
+                    "record": record,
+                    "semantic_text": core.record_semantic_text(record),
+                    "normalize_fp": fp.get("normalize")
+                })
+
+            # Vectors are only known when a local embedder cached them
+            if core.embedder is not None and entries:
+                cached = core.embedder.peek([e["semantic_text"] for e in entries])
+                for entry, vector in zip(entries, cached):
+                    entry["vector"] = _pack_vector(vector)
+
+            writer.write_chunk(entries)
+            _progress("exported", writer.count, started, len(entries))
+    except BaseException:
+        writer.abort()
+        raise
+
+    writer.close()
+    return writer.count
+
+
+# =========================
+# IMPORT
+# =========================
+def _import_chunk(core, entries, reuse_vectors):
+    """
+    Writes one chunk: records (and cards) first, then vectors, then the
+    fingerprints of whatever landed. Returns (stored, failed, hospitals).
+    """
+    pipe = core.record_redis.pipeline(transaction=False)
+    for entry in entries:
+        core.save_record(entry["id"], entry["record"], pipe=pipe)
+    with metrics.timed("redis_write"):
+        pipe.execute()
+
+    texts = [entry["semantic_text"] for entry in entries]
+    vectors = [_unpack_vector(entry.get("vector")) if reuse_vectors else None for entry in entries]
+
+    if reuse_vectors:
+        known = [i for i, v in enumerate(vectors) if v is not None]
+        core.embedder.prime([texts[i] for i in known], [vectors[i] for i in known])
+
+    # Anything without a usable vector is embedded here (or by the server)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    for i, vector in zip(missing, core.embed_texts([texts[i] for i in missing])):
+        vectors[i] = vector
+
+    routed = [
+        (entry["hospital"], core.build_vector_item(entry["id"], entry["hospital"], text, vector))
+        for entry, text, vector in zip(entries, texts, vectors)
+    ]
+
+    stored, failed = [], 0
+    for start in range(0, len(routed), max(1, core.BULK_UPSERT_CHUNK_SIZE)):
+        part = slice(start, start + max(1, core.BULK_UPSERT_CHUNK_SIZE))
+        try:
+            core.upsert_vectors(routed[part])
+            stored.extend(entries[part])
+        except Exception as e:
+            core.logger.error("Snapshot upsert failed: %s", e)
+            failed += len(entries[part])
+
+    core.store_fingerprints([
+        (entry["id"], entry.get("normalize_fp"), core.vector_fingerprint(entry["hospital"], entry["semantic_text"]))
+        for entry in stored
+    ])
+    return len(stored), failed, {entry["hospital"] for entry in stored}
+
+
+def import_snapshot(path, workers=4):
+    """
+    Loads every chunk with `workers` chunks in flight; the semaphore keeps
+    memory bounded to that many decoded chunks.
+    """
+    import app as core
+
+    reader = SnapshotReader(path)
+    vector_space = core.embedder.name if core.embedder else None
+    reuse_vectors = vector_space is not None and vector_space == reader.meta.get("vector_space")
+
+    if reader.meta.get("gemini_model") != core.GEMINI_MODEL:
+        # Summaries are still imported; only the skip-normalization hint is stale
+        print("⚠️  Snapshot was normalized with another GEMINI_MODEL", file=sys.stderr)
+
+    inflight = threading.Semaphore(max(1, workers))
+    lock = threading.Lock()
+    totals = {"stored": 0, "failed": 0, "hospitals": set()}
+    started = time.perf_counter()
+
+    def load(n):
+        try:
+            stored, failed, hospitals = _import_chunk(core, reader.chunk(n), reuse_vectors)
+        except Exception as e:
+            core.logger.error("Snapshot chunk %d failed: %s", n, e)
+            stored, failed, hospitals = 0, reader.meta["chunks"][n][2], set()
+        finally:
+            inflight.release()
+
+        with lock:
+            before = totals["stored"] + totals["failed"]
+            totals["stored"] += stored
+            totals["failed"] += failed
+            totals["hospitals"] |= hospitals
+            _progress("imported", totals["stored"], started, totals["stored"] + totals["failed"] - before)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for n in range(reader.chunk_count):
+            inflight.acquire()
+            pool.submit(load, n)
+
+    if totals["hospitals"]:
+        core.invalidate_search_cache(totals["hospitals"])
+
+    reader.close()
+    return totals["stored"], totals["failed"], reuse_vectors
+
+
+def _progress(verb, done, started, step, every=10_000):
+    if done // every != (done - step) // every:
+        rate = done / (time.perf_counter() - started)
+        print(f"⏳ {done} {verb} ({rate:.0f}/s)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_export = sub.add_parser("export", help="write every stored encounter to a snapshot")
+    p_export.add_argument("path")
+    p_export.add_argument("--chunk-size", type=int, default=1000, help="entries per compressed chunk")
+
+    p_import = sub.add_parser("import", help="bulk-load a snapshot into Redis and CyborgDB")
+    p_import.add_argument("path")
+    p_import.add_argument("--workers", type=int, default=4, help="chunks loaded concurrently")
+
+    p_info = sub.add_parser("info", help="print a snapshot's footer")
+    p_info.add_argument("path")
+
+    args = parser.parse_args()
+    started = time.perf_counter()
+
+    if args.command == "info":
+        reader = SnapshotReader(args.path)
+        meta = {k: v for k, v in reader.meta.items() if k != "chunks"}
+        print(json.dumps({**meta, "chunk_count": reader.chunk_count}, indent=2))
+        reader.close()
+        return
+
+    if args.command == "export":
+        count = export_snapshot(args.path, args.chunk_size)
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(args.path)
+        print(
+            f"✅ Exported {count} encounters to {args.path} ({size / 1e6:.1f} MB) in {elapsed:.1f}s",
+            file=sys.stderr
+        )
+        return
+
+    stored, failed, reused = import_snapshot(args.path, args.workers)
+    elapsed = time.perf_counter() - started
+    print(
+        f"✅ Imported {stored} encounters in {elapsed:.1f}s ({stored / elapsed if elapsed else 0:.0f}/s), "
+        f"{failed} failed, vectors {'reused' if reused else 're-embedded'}",
+        file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    main()
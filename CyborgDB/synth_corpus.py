@@ -0,0 +1,251 @@
+"""
+MedSec – Synthetic encounter corpus
+Scales the load_demo_data specialty templates to arbitrary sizes by mutating
+complaints, medications, outcomes and dates, spread across M hospitals.
+
+Records are generated lazily and written one at a time, so memory stays
+constant whether you ask for a thousand encounters or ten million. Output is
+backend-shaped (the same JSON the Node service sends to /upsert-encounter)
+and deterministic for a given --seed.
+
+Usage:
+    python synth_corpus.py -n 100000 -m 50 -o corpus.ndjson.gz
+    python synth_corpus.py -n 1000000 --post http://localhost:7000 --batch-size 500
+    python synth_corpus.py -n 10 -o -                        # NDJSON to stdout
+"""
+
+import argparse
+import gzip
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from load_demo_data import MOCK_DATA
+
+# Hospitals from the demo data keep their ids; the rest are numbered
+DEMO_HOSPITALS = sorted({case["hospital_id"] for case in MOCK_DATA})
+
+ONSETS = [
+    "", "Acute onset of ", "Sudden ", "Gradual onset of ", "Recurrent ",
+    "2-day history of ", "1-week history of ", "Intermittent ", "Worsening ",
+]
+PATIENT_CONTEXT = [
+    "", " in elderly patient", " in young adult", " in pediatric patient",
+    " with history of hypertension", " with type 2 diabetes", " in smoker",
+    " post-operative day 2", " in pregnant patient", " after recent travel",
+]
+DOSE_FACTORS = [0.5, 1, 1, 1, 1.5, 2]
+OUTCOME_SUFFIXES = [
+    "", " Follow-up in 1 week.", " Follow-up in 2 weeks.",
+    " Referred to specialist clinic.", " Readmitted within 30 days.",
+    " Discharged home with caregiver support.", " Transferred to step-down unit.",
+]
+
+
+def _specialty(encounter_id):
+    # CARDIO_001 -> CARDIO
+    return encounter_id.rsplit("_", 1)[0]
+
+
+def _build_pools():
+    """
+    Medication and outcome pools per specialty, so mutations stay
+    clinically plausible for the template they're applied to.
+    """
+    meds, outcomes = {}, {}
+    for case in MOCK_DATA:
+        spec = _specialty(case["encounter_id"])
+        meds.setdefault(spec, set()).update(case["summary"].get("medications", []))
+        outcomes.setdefault(spec, []).append(case["raw_encounter"]["outcome"])
+    return {k: sorted(v) for k, v in meds.items()}, outcomes
+
+
+MED_POOLS, OUTCOME_POOLS = _build_pools()
+
+
+def hospital_ids(count):
+    extra = [f"SYN_HOSP_{i:04d}" for i in range(1, max(0, count - len(DEMO_HOSPITALS)) + 1)]
+    return (DEMO_HOSPITALS + extra)[:count]
+
+
+def _mutate_treatment(rng, treatment, meds):
+    # Scale the first dose in the text and append any extra sampled meds
+    words = treatment.split()
+    for i, w in enumerate(words):
+        digits = w.rstrip("mg.,")
+        if w.endswith(("mg", "mg.", "mg,")) and digits.isdigit():
+            scaled = max(1, round(int(digits) * rng.choice(DOSE_FACTORS)))
+            words[i] = w.replace(digits, str(scaled), 1)
+            break
+
+    text = " ".join(words)
+    extra = [m for m in meds if m not in text]
+    if extra:
+        text += " Added " + ", ".join(extra) + "."
+    return text
+
+
+def generate(count, hospitals=len(DEMO_HOSPITALS), seed=42, start_date=datetime(2023, 1, 1), days=730, id_prefix="SYN"):
+    """
+    Yields `count` encounters. Only the generator state is held in memory.
+    """
+    rng = random.Random(seed)
+    hospital_pool = hospital_ids(hospitals)
+    width = max(7, len(str(count)))
+
+    for n in range(count):
+        case = rng.choice(MOCK_DATA)
+        raw = case["raw_encounter"]
+        spec = _specialty(case["encounter_id"])
+
+        template_meds = case["summary"].get("medications", [])
+        pool = MED_POOLS[spec]
+        meds = rng.sample(template_meds, k=rng.randint(1, len(template_meds))) if template_meds else []
+        if pool and rng.random() < 0.3:
+            meds.append(rng.choice(pool))
+
+        complaint = raw["chief_complaint"]
+        onset = rng.choice(ONSETS)
+        if onset:
+            complaint = onset + complaint[0].lower() + complaint[1:]
+        complaint += rng.choice(PATIENT_CONTEXT)
+
+        # Mostly the template's own outcome; sometimes a sibling from the same specialty
+        outcome = raw["outcome"] if rng.random() < 0.7 else rng.choice(OUTCOME_POOLS[spec])
+        outcome += rng.choice(OUTCOME_SUFFIXES)
+        started = start_date + timedelta(days=rng.randrange(days), minutes=rng.randrange(24 * 60))
+
+        yield {
+            "_id": f"{id_prefix}_{n:0{width}d}",
+            "hospital": rng.choice(hospital_pool),
+            "encounterType": rng.choice(["outpatient", "outpatient", "inpatient", "emergency"]),
+            "startedAt": started.isoformat() + "Z",
+            "chiefComplaint": complaint,
+            "diagnosis": raw["diagnosis"],
+            "treatment": _mutate_treatment(rng, raw["treatment"], meds),
+            "outcome": outcome,
+            "vitals": {
+                "temperatureC": round(rng.uniform(36.2, 39.8), 1),
+                "pulse": rng.randint(55, 130),
+                "systolicBP": rng.randint(95, 180),
+                "diastolicBP": rng.randint(55, 110),
+                "spo2": rng.randint(88, 100),
+            },
+            "prescriptions": [{
+                "items": [{"name": m, "frequency": rng.choice(["Once daily", "BID", "TID", "PRN"])} for m in meds]
+            }],
+        }
+
+
+def batches(iterable, size):
+    it = iter(iterable)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+# =========================
+# SINKS
+# =========================
+def write_ndjson(records, path):
+    if path == "-":
+        out = sys.stdout
+    elif path.endswith(".gz"):
+        out = gzip.open(path, "wt", encoding="utf-8")
+    else:
+        out = open(path, "w", encoding="utf-8")
+
+    written = 0
+    try:
+        for record in records:
+            out.write(json.dumps(record, separators=(",", ":")))
+            out.write("\n")
+            written += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return written, 0
+
+
+def post_bulk(records, base_url, batch_size, concurrency, progress_every=10_000):
+    """
+    Streams batches into /upsert-encounters with at most `concurrency`
+    requests in flight; the semaphore keeps memory bounded to
+    concurrency x batch_size records.
+    """
+    import requests
+
+    session = requests.Session()
+    inflight = threading.Semaphore(concurrency)
+    lock = threading.Lock()
+    totals = {"sent": 0, "failed": 0}
+    started = time.perf_counter()
+
+    def send(batch):
+        try:
+            resp = session.post(f"{base_url.rstrip('/')}/upsert-encounters", json={"encounters": batch})
+            if resp.status_code in (200, 207):
+                failed = sum(1 for r in resp.json().get("results", []) if r.get("status") == "error")
+            else:
+                failed = len(batch)
+        except requests.exceptions.RequestException:
+            failed = len(batch)
+        finally:
+            inflight.release()
+
+        with lock:
+            before = totals["sent"]
+            totals["sent"] += len(batch)
+            totals["failed"] += failed
+            if totals["sent"] // progress_every != before // progress_every:
+                rate = totals["sent"] / (time.perf_counter() - started)
+                print(f"⏳ {totals['sent']} sent, {totals['failed']} failed ({rate:.0f}/s)", file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for batch in batches(records, batch_size):
+            inflight.acquire()
+            pool.submit(send, batch)
+
+    return totals["sent"] - totals["failed"], totals["failed"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--count", type=int, required=True, help="encounters to generate")
+    parser.add_argument("-m", "--hospitals", type=int, default=len(DEMO_HOSPITALS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--id-prefix", default="SYN")
+    parser.add_argument("-o", "--output", help="NDJSON file (.gz to compress, - for stdout)")
+    parser.add_argument("--post", metavar="URL", help="service base URL to bulk-ingest into")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    if bool(args.output) == bool(args.post):
+        raise SystemExit("Pass exactly one of --output or --post")
+
+    records = generate(args.count, args.hospitals, args.seed, id_prefix=args.id_prefix)
+    started = time.perf_counter()
+
+    if args.output:
+        ok, failed = write_ndjson(records, args.output)
+    else:
+        ok, failed = post_bulk(records, args.post, args.batch_size, args.concurrency)
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"✅ {ok} encounters across {args.hospitals} hospitals in {elapsed:.1f}s "
+        f"({ok / elapsed if elapsed else 0:.0f}/s), {failed} failed",
+        file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    main()
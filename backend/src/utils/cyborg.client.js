@@ -16,7 +16,9 @@ export async function upsertEncounter(encounter) {
 
   try {
     const fetch = await getFetch();
-    const url = `${CYBORG_URL.replace(/\/$/, '')}/upsert-encounter`;
+    // Async mode: the microservice queues the job and replies 202 without
+    // waiting on Gemini normalization or the vector upsert.
+    const url = `${CYBORG_URL.replace(/\/$/, '')}/upsert-encounter?mode=async`;
 
     const res = await fetch(url, {
       method: 'POST',
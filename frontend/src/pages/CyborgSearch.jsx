@@ -10,6 +10,7 @@ export const CyborgSearch = () => {
   const [results, setResults] = useState(null);
   const [synthesis, setSynthesis] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [synthesizing, setSynthesizing] = useState(false);
   const [activeItem, setActiveItem] = useState(null);
   const [scope, setScope] = useState('global');
   const [showRaw, setShowRaw] = useState(false);
@@ -75,7 +76,8 @@ export const CyborgSearch = () => {
     setSynthesis(null);
 
     try {
-      const response = await fetch(`${CyborgDBURL}/search-advanced`, {
+      // NDJSON stream: "matches" arrives after retrieval, "synthesis" after Gemini
+      const response = await fetch(`${CyborgDBURL}/search-advanced/stream`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -85,26 +87,75 @@ export const CyborgSearch = () => {
         }),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error(`Backend error: ${response.statusText}`);
       }
 
-      const data = await response.json();
-
-      const normalized = (data.matches || []).map((r) => ({
-        ...r,
-        encounter: normalizeEncounter(r.encounter),
-      }));
-
-      console.log('Cyborg search results:', normalized);
+      const handleEvent = (data) => {
+        if (data.event === 'matches') {
+          const normalized = (data.matches || []).map((r) => ({
+            ...r,
+            encounter: normalizeEncounter(r.encounter),
+          }));
+
+          console.log('Cyborg search results:', normalized);
+
+          setResults(normalized);
+          setLoading(false);
+          setSynthesizing(normalized.length > 0);
+        } else if (data.event === 'synthesis') {
+          setSynthesis(data.synthesis || null);
+          setSynthesizing(false);
+        }
+      };
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+
+        lines.filter((line) => line.trim()).forEach((line) => handleEvent(JSON.parse(line)));
+      }
 
-      setResults(normalized);
-      setSynthesis(data.synthesis || null);
+      if (buffer.trim()) handleEvent(JSON.parse(buffer));
     } catch (err) {
       console.error('Cyborg search failed', err);
       toast.error('Search failed. Is app_secure.py running?');
     } finally {
       setLoading(false);
+      setSynthesizing(false);
+    }
+  };
+
+  /* =========================
+     DETAILS
+     Search returns compact cards; the full
+     encounter is only fetched for own-hospital views.
+  ========================= */
+  const openDetails = async (r, isLocal) => {
+    if (!isLocal) {
+      setActiveItem({ data: r.encounter, sameHospital: false });
+      return;
+    }
+
+    try {
+      const response = await fetch(
+        `${CyborgDBURL}/encounters/${encodeURIComponent(r.encounter_id)}?hospital_id=${encodeURIComponent(user.hospital)}`
+      );
+      if (!response.ok) throw new Error(`Backend error: ${response.statusText}`);
+
+      const data = await response.json();
+      setActiveItem({ data: normalizeEncounter(data.encounter), sameHospital: true });
+    } catch (err) {
+      console.error('Encounter fetch failed', err);
+      toast.error('Could not load encounter details');
     }
   };
 
@@ -249,6 +300,9 @@ export const CyborgSearch = () => {
       </div>
 
       {/* AI SYNTHESIS SECTION */}
+      {synthesizing && (
+        <div className="mb-8 text-center py-6 text-blue-400 animate-pulse">Generating MedSec AI Analysis...</div>
+      )}
       {synthesis && (
         <div className="mb-8 bg-gradient-to-r from-slate-50 to-blue-50 border border-blue-100 rounded-xl p-6 shadow-sm">
           <h3 className="text-lg font-bold text-blue-900 mb-4 flex items-center gap-2">
@@ -295,7 +349,7 @@ export const CyborgSearch = () => {
                   <p className="text-gray-600 text-sm mt-1"><strong>Complaint:</strong> {safeRender(enc.chief_complaint)}</p>
                 </div>
                 <button
-                  onClick={() => setActiveItem({ data: enc, sameHospital: isLocal })}
+                  onClick={() => openDetails(r, isLocal)}
                   className={`px-4 py-2 text-sm rounded-md font-medium transition-colors ${isLocal ? "bg-blue-50 text-blue-700 hover:bg-blue-100 border border-blue-200" : "bg-amber-50 text-amber-700 hover:bg-amber-100 border border-amber-200"}`}
                 >
                   {isLocal ? "View Details" : "View Redacted Summary"}